@@ -1,7 +1,7 @@
 import json
 import os
 import yaml
-from os.path import join, dirname
+from os.path import join, dirname, expanduser
 
 from dotenv import load_dotenv
 
@@ -21,26 +21,92 @@ class Config:
 
     FILE_BROWSER_USER = os.environ.get("FILE_BROWSER_USER", None)
     FILE_BROWSER_PASSWORD = os.environ.get("FILE_BROWSER_PASSWORD", None)
+    FILE_BROWSER_TOKEN_TTL = int(os.environ.get("FILE_BROWSER_TOKEN_TTL", 7200))
+    FILE_BROWSER_TOKEN_REFRESH_MARGIN = 60
 
     TIME_OUT_API = 60
     TIME_SLEEP = int(os.environ.get("TIME_SLEEP", 15))
+    WAIT_FOR_COMPLETION = os.environ.get("WAIT_FOR_COMPLETION", "true").lower() == "true"
+    POLL_INTERVAL_MIN = float(os.environ.get("POLL_INTERVAL_MIN", 10))
+    POLL_INTERVAL_MAX = float(os.environ.get("POLL_INTERVAL_MAX", 60))
+    POLL_STABLE_ROUNDS = int(os.environ.get("POLL_STABLE_ROUNDS", 3))
+    WAIT_HISTORY_MAX_FILES = int(os.environ.get("WAIT_HISTORY_MAX_FILES", 50))
+    WAIT_INITIAL_RATIO = float(os.environ.get("WAIT_INITIAL_RATIO", 0.7))
+    WAIT_DEADLINE_RATIO = float(os.environ.get("WAIT_DEADLINE_RATIO", 3))
 
     URL_GET_RULE_CODE = "/api/rules/"   # /api/rules/{ruleCode}
     URL_UPDATE_RULE_CODE = "/api/rule/"
     URL_POST_VIDEO = "/api/videos"
     URL_CHECK_MISSING_VIDEO = "/api/videos/check"
     URL_ANALYZE_VIDEO = "/api/videos/analyze"
+    URL_GET_EVIDENCES = "/api/evidences"
+
+    HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+    HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 3))
+    HTTP_BACKOFF_SECONDS = float(os.environ.get("HTTP_BACKOFF_SECONDS", 0.5))
+    HTTP_RETRY_BUDGET = int(os.environ.get("HTTP_RETRY_BUDGET", 100))
+    HTTP_CIRCUIT_FAILURES = int(os.environ.get("HTTP_CIRCUIT_FAILURES", 5))
+    HTTP_CIRCUIT_RESET_SECONDS = float(os.environ.get("HTTP_CIRCUIT_RESET_SECONDS", 30))
+
+    UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    UPLOAD_BATCH_MAX_BYTES = int(os.environ.get("UPLOAD_BATCH_MAX_MB", 500)) * 1024 * 1024
+    UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 3))
+    UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", 3))
+
+    EVIDENCE_PAGE_SIZE = int(os.environ.get("EVIDENCE_PAGE_SIZE", 100))
+    EVIDENCE_FETCH_WORKERS = int(os.environ.get("EVIDENCE_FETCH_WORKERS", 4))
+    EVIDENCE_PAGE_RETRIES = int(os.environ.get("EVIDENCE_PAGE_RETRIES", 3))
+    EVIDENCE_STREAMING = os.environ.get("EVIDENCE_STREAMING", "true").lower() == "true"
 
     SERVICE_ACCOUNT_FILE = join(join(dirname(dirname(__file__)), 'config'), 'service-google-sheet.json')
     SHEET_ID = os.environ.get("SHEET_ID")
+    SHEETS_QUOTA_RETRIES = int(os.environ.get("SHEETS_QUOTA_RETRIES", 5))
+    SHEETS_BACKOFF_SECONDS = float(os.environ.get("SHEETS_BACKOFF_SECONDS", 2))
+    SHEETS_BACKOFF_MAX_SECONDS = float(os.environ.get("SHEETS_BACKOFF_MAX_SECONDS", 64))
+    # Serve sheets from a file written by `python -m src.utils.sheet_snapshot export` (no Sheets API calls)
+    SHEET_SNAPSHOT_FILE = os.environ.get("SHEET_SNAPSHOT_FILE") or None
+    # Write PASSED/FAILED, note and run date back to the rule sheets (needs read-write scope)
+    SHEET_WRITE_BACK = os.environ.get("SHEET_WRITE_BACK", "false").lower() == "true"
+    SHEET_RESULT_COLUMN = os.environ.get("SHEET_RESULT_COLUMN", "Q")
+    SHEET_RESULT_NOTE_COLUMN = os.environ.get("SHEET_RESULT_NOTE_COLUMN", "R")
+    SHEET_RESULT_DATE_COLUMN = os.environ.get("SHEET_RESULT_DATE_COLUMN", "S")
     SMB_SERVER = os.environ.get("SMB_SERVER")
     SMB_USER = os.environ.get("SMB_USER")
     SMB_PASSWORD = os.environ.get("SMB_PASSWORD")
 
     SMB_ROOT = "qc_ai_testing"
+    # Offline runs (python -m src.utils.offline_run): local copy of the share, <dir>/<tenant_dir>/<rule>/<video>
+    LOCAL_VIDEO_DIR = os.environ.get("LOCAL_VIDEO_DIR", join(join(dirname(dirname(__file__)), 'data_test'), 'video'))
+    FAKE_AGENT_PORT = int(os.environ.get("FAKE_AGENT_PORT", 8888))
+    SMB_DOWNLOAD_WORKERS = int(os.environ.get("SMB_DOWNLOAD_WORKERS", 4))
+    SMB_DOWNLOAD_RETRIES = int(os.environ.get("SMB_DOWNLOAD_RETRIES", 2))
+    SMB_RETRY_BACKOFF_SECONDS = float(os.environ.get("SMB_RETRY_BACKOFF_SECONDS", 1))
 
     RULES_CONFIG = load_config(join(dirname(__file__), 'rules.yaml'))
     DIR_RESULTS = join(join(dirname(dirname(__file__)), 'src'), 'results')
+    # Upload / rule-config registries and the evidence cache persist across runs, outside the source tree
+    CACHE_DIR = os.environ.get("QC_CACHE_DIR", join(os.environ.get("XDG_CACHE_HOME", expanduser('~/.cache')), 'qc_ai_testing'))
+
+    UPLOAD_REGISTRY_ENABLED = os.environ.get("UPLOAD_REGISTRY_ENABLED", "true").lower() == "true"
+    UPLOAD_REGISTRY_FILE = join(CACHE_DIR, 'upload_registry.json')
+    UPLOAD_FINGERPRINT_CACHE_FILE = join(CACHE_DIR, 'smb_fingerprints.json')
+    UPLOAD_REGISTRY_SAMPLE_SIZE = 64 * 1024
+
+    RULE_CONFIG_REGISTRY_ENABLED = os.environ.get("RULE_CONFIG_REGISTRY_ENABLED", "true").lower() == "true"
+    RULE_CONFIG_REGISTRY_FILE = join(CACHE_DIR, 'rule_config_registry.json')
+
+    DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+    EVIDENCE_CACHE_ENABLED = os.environ.get("EVIDENCE_CACHE_ENABLED", "true").lower() == "true"
+    EVIDENCE_CACHE_DIR = join(CACHE_DIR, 'evidence_cache')
+    EVIDENCE_CACHE_MAX_BYTES = int(os.environ.get("EVIDENCE_CACHE_MAX_MB", 2048)) * 1024 * 1024
+    EVIDENCE_DOWNLOAD_WORKERS = int(os.environ.get("EVIDENCE_DOWNLOAD_WORKERS", 3))
+    EVIDENCE_PREFETCH = int(os.environ.get("EVIDENCE_PREFETCH", 4))
+    EVIDENCE_DOWNLOAD_TIMEOUT = int(os.environ.get("EVIDENCE_DOWNLOAD_TIMEOUT", 300))
+    # Fetch only the byte ranges of the frames to draw (needs HTTP Range support on the file browser)
+    EVIDENCE_PARTIAL_FETCH = os.environ.get("EVIDENCE_PARTIAL_FETCH", "false").lower() == "true"
+    EVIDENCE_RANGE_HEAD_BYTES = int(os.environ.get("EVIDENCE_RANGE_HEAD_BYTES", 256 * 1024))
+    EVIDENCE_RANGE_LEAD_FRAMES = int(os.environ.get("EVIDENCE_RANGE_LEAD_FRAMES", 16))
+    EVIDENCE_RANGE_TRAILING_FRAMES = int(os.environ.get("EVIDENCE_RANGE_TRAILING_FRAMES", 2))
 
     DIR_EXPECTED_IMAGE = join(join(dirname(dirname(__file__)), 'data_test'), 'expected_frame')
     DIR_EVIDENCE_IMAGE = join(join(dirname(dirname(__file__)), 'data_test'), 'evidence_frame')
@@ -1,22 +1,45 @@
+import base64
+import json
 import logging
-from typing import List, Dict, Optional, Tuple
+import os
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Optional, Tuple, Iterator
 
 import requests
 
 from config.settings import cf
+from src.connectors.http_transport import HttpTransport
+from src.connectors.multipart import MultipartFileStream, VideoSource
+from src.utils.mp4_index import Mp4IndexError, Mp4SampleIndex, locate_moov
 
 logger = logging.getLogger(__name__)
 
 
+class DownloadCancelled(Exception):
+    """Evidence download stopped because its cancel event was set"""
+
+
 class AIAPIClient:
 
     def __init__(self, base_url: str, api_key: Optional[str] = None, timeout: int = 20, debug = False):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key or cf.API_KEY
         self.timeout = timeout or cf.TIMEOUT
-        self.session = requests.Session()
+        # Streamed upload bodies cannot be replayed; UploadScheduler retries whole batches instead.
+        # An analyze call that timed out may still have been accepted, replaying it analyses videos twice.
+        # Evidence pages are retried here only (no page-level loop on top), a failed page retries alone.
+        self.transport = HttpTransport(self.base_url, endpoint_retries={
+            cf.URL_POST_VIDEO: 0, cf.URL_ANALYZE_VIDEO: 0, cf.URL_GET_EVIDENCES: cf.EVIDENCE_PAGE_RETRIES})
+        self.session = self.transport.session
         self.debug = debug
         self.hard_headers = {"X-API-Key": self.api_key} if self.api_key else {}
+        # Largest evidences page the server serves, learned by iter_evidences_after (None: not capped)
+        self.evidence_page_cap: Optional[int] = None
 
     def _headers(self) -> Dict[str, str]:
         return {"X-API-Key": self.api_key} if self.api_key else {}
@@ -27,18 +50,25 @@ class AIAPIClient:
             return {}
         url = f"{self.base_url}{cf.URL_UPDATE_RULE_CODE}"
         data_update = {"rule_code": rule_code, "config": config}
-        response = self.session.post(url, json=data_update, headers=self.hard_headers, timeout=self.timeout)
+        response = self.transport.request('POST', url, endpoint=cf.URL_UPDATE_RULE_CODE, json=data_update,
+                                          headers=self.hard_headers, timeout=self.timeout)
         response.raise_for_status()
         logger.info(f"API update rule: {rule_code}" )
         return data_update
 
-    def upload_videos(self, videos: List[Tuple[str, bytes]]) -> Dict:
-        """Upload videos: [(filename, video_data), ...]"""
+    def upload_videos(self, videos: List[Tuple[str, VideoSource]]) -> Dict:
+        """
+        Upload videos: [(filename, source), ...]
+        source can be bytes, a file path or a binary file-like object.
+        The multipart body is streamed in chunks, sources are never loaded fully into memory.
+        """
         if self.debug:
             return {}
         url = f"{self.base_url}{cf.URL_POST_VIDEO}"
-        files = [('videos', (name, data, 'video/mp4')) for name, data in videos]
-        response = self.session.post(url, files=files, headers=self.hard_headers, timeout=self.timeout)
+        body = MultipartFileStream('videos', videos, content_type='video/mp4', chunk_size=cf.UPLOAD_CHUNK_SIZE)
+        headers = {**self.hard_headers, "Content-Type": body.content_type}
+        response = self.transport.request('POST', url, endpoint=cf.URL_POST_VIDEO, data=body,
+                                          headers=headers, timeout=self.timeout)
         response.raise_for_status()
         logger.info(f"Uploaded {len(videos)} videos")
         return response.json()
@@ -46,7 +76,8 @@ class AIAPIClient:
     def check_missing_videos(self, filenames: List[str]) -> List[str]:
         """Check videos not yet upload"""
         url = f"{self.base_url}{cf.URL_CHECK_MISSING_VIDEO}"
-        response = self.session.post(url, json={"videos": filenames}, headers=self.hard_headers, timeout=self.timeout)
+        response = self.transport.request('POST', url, endpoint=cf.URL_CHECK_MISSING_VIDEO, json={"videos": filenames},
+                                          headers=self.hard_headers, timeout=self.timeout)
         response.raise_for_status()
         return response.json().get("missing_videos", [])
 
@@ -56,7 +87,8 @@ class AIAPIClient:
             return 200
         url = f"{self.base_url}{cf.URL_ANALYZE_VIDEO}"
         payload = {"batch_code": batch_code, "videos_config": videos_config}
-        response = self.session.post(url, json=payload, headers=self.hard_headers, timeout=self.timeout)
+        response = self.transport.request('POST', url, endpoint=cf.URL_ANALYZE_VIDEO, json=payload,
+                                          headers=self.hard_headers, timeout=self.timeout)
         response.raise_for_status()
         logger.info(f"Started analysis: {batch_code}")
         return response.status_code
@@ -64,51 +96,172 @@ class AIAPIClient:
     def get_evidences(self, batch_code: Optional[str] = None, rule_code: Optional[str] = None,
                       page: int = 1, page_size: int = 20) -> Dict:
         """Get evidences with filter"""
-        url = f"{self.base_url}/api/evidences"
+        url = f"{self.base_url}{cf.URL_GET_EVIDENCES}"
         params = {"page": page, "page_size": page_size}
         if batch_code:
             params["batch_code"] = batch_code
         if rule_code:
             params["rule_code"] = rule_code
 
-        response = self.session.get(url, params=params, headers=self.hard_headers, timeout=self.timeout)
+        response = self.transport.request('GET', url, endpoint=cf.URL_GET_EVIDENCES, params=params,
+                                          headers=self.hard_headers, timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
-    def get_all_evidences(self, batch_code: str, rule_code: Optional[str] = None) -> List[Dict]:
-        """Get all evidences (auto pagination)"""
-        all_data = []
-        page = 1
+    def iter_evidence_pages(self, batch_code: str, rule_code: Optional[str] = None,
+                            page_size: int = cf.EVIDENCE_PAGE_SIZE,
+                            max_workers: int = cf.EVIDENCE_FETCH_WORKERS) -> Iterator[List[Dict]]:
+        """
+        Yield evidence pages in page order
+        Page 1 gives `total` and the page size the server actually applies (it may cap page_size).
+        Remaining pages are fetched concurrently with max_workers threads, at most max_workers pages
+        ahead of the consumer (max_workers=1 walks pages sequentially).
+        """
+        first = self.get_evidences(batch_code, rule_code, 1, page_size)
+        data = first.get("data", [])
+        total = first.get("total", 0)
+        served_page_size = len(data) if 0 < len(data) < min(page_size, total) else page_size
+        total_pages = max(1, -(-total // served_page_size))
+        received = len(data)
+        yield data
+
+        def fetch_page(page: int) -> List[Dict]:
+            return self.get_evidences(batch_code, rule_code, page, page_size).get("data", [])
+
+        remaining_pages = iter(range(2, total_pages + 1))
+        workers = max(1, min(max_workers, total_pages - 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            window = deque(executor.submit(fetch_page, page) for page in islice(remaining_pages, workers))
+            try:
+                while window:
+                    data = window.popleft().result()
+                    for page in islice(remaining_pages, 1):
+                        window.append(executor.submit(fetch_page, page))
+                    received += len(data)
+                    yield data
+            finally:
+                for future in window:
+                    future.cancel()
+
+        # Pages shorter than expected (page size changed mid-run): keep walking until `total` is reached
+        page = total_pages
+        while received < total:
+            page += 1
+            data = fetch_page(page)
+            if not data:
+                logger.warning(f"Evidences stopped at page {page}: got {received}/{total}")
+                break
+            received += len(data)
+            yield data
+
+        logger.info(f"Got {received}/{total} evidences ({page} pages)")
+
+    def iter_evidences(self, batch_code: str, rule_code: Optional[str] = None,
+                       page_size: int = cf.EVIDENCE_PAGE_SIZE,
+                       max_workers: int = cf.EVIDENCE_FETCH_WORKERS) -> Iterator[Dict]:
+        """Yield evidences one by one, pages are prefetched concurrently (see iter_evidence_pages)"""
+        for data in self.iter_evidence_pages(batch_code, rule_code, page_size, max_workers):
+            yield from data
+
+    def iter_evidences_after(self, batch_code: str, rule_code: Optional[str], offset: int,
+                             page_size: int = cf.EVIDENCE_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Yield evidences from list position `offset` on, reading only the pages that hold them
+        For pollers that already read the first `offset` evidences: the agent appends evidences as
+        videos finish, so earlier pages are never read twice. A short page that does not end at `total`
+        means the server caps page_size (its pages then start elsewhere): the cap is read from page 1,
+        remembered in evidence_page_cap, and the page is requested again.
+        """
+        position = offset
         while True:
-            result = self.get_evidences(batch_code, rule_code, page, 100)
+            page_size = min(page_size, self.evidence_page_cap or page_size)
+            page = position // page_size + 1
+            result = self.get_evidences(batch_code, rule_code, page, page_size)
             data = result.get("data", [])
+            total = result.get("total", 0)
+            start = (page - 1) * page_size
+            if len(data) < page_size and start + len(data) != total and position < total:
+                served = len(self.get_evidences(batch_code, rule_code, 1, page_size).get("data", []))
+                if not 0 < served < page_size:
+                    logger.warning(f"Evidences stopped at {position}/{total}: inconsistent page {page}")
+                    return
+                logger.info(f"Evidences page size capped by server: {served} (asked {page_size})")
+                self.evidence_page_cap = served
+                continue
+            yield from data[position - start:]
+            position = max(position, start + len(data))
+            if not data or position >= total:
+                return
+
+    def get_all_evidences(self, batch_code: str, rule_code: Optional[str] = None,
+                          page_size: int = cf.EVIDENCE_PAGE_SIZE,
+                          max_workers: int = cf.EVIDENCE_FETCH_WORKERS) -> List[Dict]:
+        """Get all evidences (auto pagination, pages fetched concurrently), result keeps page order"""
+        all_data = []
+        for data in self.iter_evidence_pages(batch_code, rule_code, page_size, max_workers):
             all_data.extend(data)
-            if len(all_data) >= result.get("total", 0):
-                break
-            page += 1
-        logger.info(f"Got {len(all_data)} evidences")
         return all_data
 
 
 class FileBrowserAPIClient:
 
-    def __init__(self, base_url: str, user: str = cf.FILE_BROWSER_USER, password: str = cf.FILE_BROWSER_PASSWORD, timeout: int = 20, debug = False):
+    def __init__(self, base_url: str, user: str = cf.FILE_BROWSER_USER, password: str = cf.FILE_BROWSER_PASSWORD, timeout: int = 20, debug = False,
+                 cache=None):
+        """cache: optional EvidenceVideoCache, evidence videos are then downloaded at most once"""
         self.user, self.password = user, password
+        self.cache = cache
         self.base_url = base_url.rstrip('/')
         self.api_login = '/api/login'
         self.api_raw_evidence = '/api/raw'
         self.timeout = timeout or cf.TIMEOUT
-        self.session = requests.Session()
+        self.transport = HttpTransport(self.base_url)
+        self.session = self.transport.session
         self.debug = debug
+        # Auth token shared by every thread using this client
+        self._token = None
+        self._token_expires_at = 0.0
+        self._auth_lock = threading.Lock()
 
-    def get_cookies(self) -> Dict[str, str]:
+    @staticmethod
+    def _token_expiry(token: str) -> float:
+        """Expiry (epoch seconds) from the JWT `exp` claim, or now + FILE_BROWSER_TOKEN_TTL"""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+        except (IndexError, KeyError, ValueError, TypeError):
+            return time.time() + cf.FILE_BROWSER_TOKEN_TTL
+
+    def login(self) -> Optional[str]:
+        """Post /api/login and cache the token"""
         url = f"{self.base_url}{self.api_login}"
         payload = {"username": self.user, "password": self.password}
-        response = self.session.post(url, json=payload, timeout=self.timeout)
+        response = self.transport.request('POST', url, endpoint=self.api_login, json=payload, timeout=self.timeout)
         if response.status_code != 200:
             logger.warning(f"API File Browser login failed: {response.text}")
-        cookies = response.text
-        return {'Cookie': f'auth={cookies}'}
+            self._token, self._token_expires_at = None, 0.0
+            return response.text
+
+        self._token = response.text
+        self._token_expires_at = self._token_expiry(self._token)
+        logger.debug(f"API File Browser logged in, token valid for {self._token_expires_at - time.time():.0f}s")
+        return self._token
+
+    def get_cookies(self, force_login: bool = False) -> Dict[str, str]:
+        """Auth cookie from the cached token, logging in only when missing, expiring or forced"""
+        with self._auth_lock:
+            expiring = time.time() >= self._token_expires_at - cf.FILE_BROWSER_TOKEN_REFRESH_MARGIN
+            if force_login or self._token is None or expiring:
+                token = self.login()
+            else:
+                token = self._token
+        return {'Cookie': f'auth={token}'}
+
+    def invalidate_token(self, token_header: Dict[str, str] = None):
+        """Drop cached token (only if it is still the one that was rejected)"""
+        with self._auth_lock:
+            if token_header is None or token_header.get('Cookie') == f'auth={self._token}':
+                self._token, self._token_expires_at = None, 0.0
 
     def create_headers(self) -> Dict[str, str]:
         cookies = self.get_cookies()
@@ -118,16 +271,171 @@ class FileBrowserAPIClient:
     def get_raw_video_evidence_by_code(self, rule_code: str, camera_code: str, event_code: str):
         pass
 
-    def get_raw_video_evidence_by_filepath(self, file_path_raw: str):
+    def get_raw_video_evidence_by_filepath(self, file_path_raw: str, stream: bool = False,
+                                           byte_range: Tuple[int, int] = None):
+        """byte_range: optional (start, end) inclusive, answered with 206 by servers supporting Range"""
         if file_path_raw.startswith("/evidence"):
             file_path_raw = file_path_raw[len("/evidence"):]
+        range_header = {'Range': f'bytes={byte_range[0]}-{byte_range[1]}'} if byte_range else {}
         header = self.create_headers()
         url_api = f"{self.base_url}{self.api_raw_evidence}{file_path_raw}"
-        response = self.session.get(url_api, headers=header, timeout=self.timeout)
-        if response.status_code != 200:
+        response = self.transport.request('GET', url_api, endpoint=self.api_raw_evidence,
+                                          headers={**header, **range_header}, timeout=self.timeout, stream=stream)
+        if response.status_code == 401:
+            # Token expired or revoked on server: log in again once
+            logger.info("API File Browser token rejected, logging in again")
+            response.close()
+            self.invalidate_token(header)
+            header = self.create_headers()
+            response = self.transport.request('GET', url_api, endpoint=self.api_raw_evidence,
+                                              headers={**header, **range_header}, timeout=self.timeout, stream=stream)
+        if response.status_code not in (200, 206):
             logger.warning(f"API File Browser Get evidence video failed: {response.text}")
         return response
 
+    def _iter_body(self, response: requests.Response, chunk_size: int,
+                   cancel: Optional[threading.Event] = None) -> Iterator[bytes]:
+        """Body chunks of a streamed response, raises DownloadCancelled as soon as cancel is set"""
+        for chunk in self.transport.iter_content(response, self.api_raw_evidence, chunk_size):
+            if cancel is not None and cancel.is_set():
+                raise DownloadCancelled("Evidence download cancelled")
+            yield chunk
+
+    def download_evidence_video(self, file_path_raw: str, target_path: str,
+                                chunk_size: int = cf.DOWNLOAD_CHUNK_SIZE,
+                                cancel: Optional[threading.Event] = None) -> bool:
+        """Stream evidence video into target_path chunk by chunk (no full-size buffer in memory)"""
+        response = self.get_raw_video_evidence_by_filepath(file_path_raw, stream=True)
+        with response:
+            if response.status_code != 200:
+                return False
+            with open(target_path, 'wb') as f:
+                for chunk in self._iter_body(response, chunk_size, cancel):
+                    f.write(chunk)
+        return True
+
+    def _get_range(self, file_path_raw: str, start: int, end: int) -> bytes:
+        """Bytes [start, end] (inclusive) of evidence video, raises Mp4IndexError if Range is not honoured"""
+        response = self.get_raw_video_evidence_by_filepath(file_path_raw, byte_range=(start, end))
+        if response.status_code != 206:
+            raise Mp4IndexError(f"Range request answered with HTTP {response.status_code}")
+        return response.content
+
+    def download_evidence_frames(self, file_path_raw: str, frame_ids: List[int], target_path: str,
+                                 chunk_size: int = cf.DOWNLOAD_CHUNK_SIZE,
+                                 cancel: Optional[threading.Event] = None) -> bool:
+        """
+        Download only the parts of evidence video needed to decode frame_ids.
+        target_path gets a sparse copy with the original size and layout: header boxes, moov and the
+        samples from the keyframe before each frame are real bytes, the rest is zero-filled. Sample
+        offsets in moov stay valid, so OpenCV seeks and decodes the wanted frames as from the full file.
+        If the server ignores Range (HTTP 200) the full video is written instead.
+        Raises Mp4IndexError when the MP4 layout cannot be indexed (caller should download the full file).
+        """
+        head_end = cf.EVIDENCE_RANGE_HEAD_BYTES - 1
+        response = self.get_raw_video_evidence_by_filepath(file_path_raw, stream=True, byte_range=(0, head_end))
+        with response:
+            if response.status_code == 200:
+                logger.debug(f"Range not supported, full download: {file_path_raw}")
+                with open(target_path, 'wb') as f:
+                    for chunk in self._iter_body(response, chunk_size, cancel):
+                        f.write(chunk)
+                return True
+            if response.status_code != 206:
+                return False
+            # Content-Range: bytes 0-262143/12345678
+            content_range = response.headers.get('Content-Range', '')
+            try:
+                total_size = int(content_range.rsplit('/', 1)[1])
+            except (IndexError, ValueError):
+                raise Mp4IndexError(f"Unusable Content-Range: {content_range!r}")
+            head = b''.join(self._iter_body(response, chunk_size, cancel))
+
+        def read_range(start: int, end: int) -> bytes:
+            if end < len(head):
+                return head[start:end + 1]
+            return self._get_range(file_path_raw, start, end)
+
+        moov_offset, moov_size = locate_moov(read_range, total_size)
+        moov = read_range(moov_offset, moov_offset + moov_size - 1)
+        index = Mp4SampleIndex.from_moov(moov)
+        # Frame 0 is always kept so the decoder can probe the stream when the file is opened
+        ranges = index.byte_ranges([0] + list(frame_ids), lead_frames=cf.EVIDENCE_RANGE_LEAD_FRAMES,
+                                   trailing_frames=cf.EVIDENCE_RANGE_TRAILING_FRAMES)
+
+        fetched = len(head)
+        with open(target_path, 'wb') as f:
+            f.truncate(total_size)
+            f.write(head)
+            f.seek(moov_offset)
+            f.write(moov)
+            for start, end in ranges:
+                if end <= len(head):
+                    continue
+                start = max(start, len(head))
+                response = self.get_raw_video_evidence_by_filepath(file_path_raw, stream=True, byte_range=(start, end - 1))
+                with response:
+                    if response.status_code != 206:
+                        raise Mp4IndexError(f"Range request answered with HTTP {response.status_code}")
+                    f.seek(start)
+                    for chunk in self._iter_body(response, chunk_size, cancel):
+                        f.write(chunk)
+                fetched += end - start
+
+        logger.debug(f"Partial evidence fetch {file_path_raw}: {len(ranges)} ranges, "
+                     f"{fetched / 1024:.0f}/{total_size / 1024:.0f} KB")
+        return True
+
+    def get_evidence_video_path(self, file_path_raw: str, target_dir: str, frame_ids: List[int] = None,
+                                pin: bool = False, cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Local path of evidence video, None if download failed or was cancelled
+        Served from cache when possible; otherwise downloaded into the cache, or into target_dir without cache.
+        With EVIDENCE_PARTIAL_FETCH and frame_ids, a cache miss fetches only those frames into target_dir
+        (partial files are never cached) and falls back to the full download if that fails.
+        pin: a returned cache path is kept from eviction until release_evidence_video(path)
+        cancel: set from another thread to stop the download; nothing is committed to the cache afterwards
+        """
+        try:
+            return self._get_evidence_video_path(file_path_raw, target_dir, frame_ids, pin, cancel)
+        except DownloadCancelled:
+            logger.debug(f"Evidence download cancelled: {file_path_raw}")
+            return None
+
+    def _get_evidence_video_path(self, file_path_raw: str, target_dir: str, frame_ids: Optional[List[int]],
+                                 pin: bool, cancel: Optional[threading.Event]) -> Optional[str]:
+        cached = self.cache.get_path(file_path_raw, pin=pin) if self.cache is not None else None
+        if cached is not None:
+            logger.debug(f"Evidence cache hit: {file_path_raw}")
+            return str(cached)
+
+        target_path = os.path.join(target_dir, os.path.basename(file_path_raw) or 'evidence.mp4')
+        if cf.EVIDENCE_PARTIAL_FETCH and frame_ids:
+            try:
+                if self.download_evidence_frames(file_path_raw, frame_ids, target_path, cancel=cancel):
+                    return target_path
+            except (Mp4IndexError, struct.error, requests.RequestException) as e:
+                logger.info(f"Partial fetch failed for {file_path_raw} ({e}), downloading full video")
+
+        if self.cache is None:
+            return target_path if self.download_evidence_video(file_path_raw, target_path, cancel=cancel) else None
+
+        tmp_path = self.cache.new_temp_path()
+        try:
+            if not self.download_evidence_video(file_path_raw, str(tmp_path), cancel=cancel):
+                return None
+            if cancel is not None and cancel.is_set():
+                raise DownloadCancelled("Evidence download cancelled")
+            return str(self.cache.commit(file_path_raw, tmp_path, pin=pin))
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def release_evidence_video(self, path: str) -> None:
+        """Let the cache evict a path returned by get_evidence_video_path(pin=True)"""
+        if self.cache is not None:
+            self.cache.release(path)
+
 # Usage
 if __name__ == "__main__":
     # api = AIAPIClient(cf.API_LOCAL)
@@ -1,24 +1,59 @@
 import os
+import gzip
 import json
+import logging
+import random
+import re
+import threading
+import time
 import gspread
+import numpy as np
+from gspread.exceptions import APIError
+from gspread.utils import absolute_range_name, fill_gaps, numericise_all, rowcol_to_a1
 from google.oauth2.service_account import Credentials
 
 from config.settings import cf
+from src.utils.test_case import TestCase, TestCaseSheetError
+
+logger = logging.getLogger(__name__)
+
+# Header of each result column written by update_results
+RESULT_HEADERS = {'result': 'Test Result', 'note': 'Test Note', 'date': 'Test Date'}
 
 
 class GoogleSheetConnector:
     """
     GoogleSheetConnector is responsible for connecting to Google Sheets
     using a service account key file and providing methods to read data.
+
+    Values are read once per worksheet into an in-memory snapshot that every accessor
+    is served from, so a run costs one spreadsheet open plus one values fetch per sheet.
+    Call refresh() to read the sheets again.
+
+    Test case accessors only fetch the test case columns (detail_rule..expected_result_column),
+    rows are left-padded locally so column indexes stay the same as in the full sheet.
+
+    With a snapshot file (see export_snapshot) the connector is offline: every sheet is served
+    from the file and a sheet missing from it is an error instead of an API call.
     """
 
-    def __init__(self, service_account_file=None, sheet_id=None):
-        """ Initialize the sheet connector. """
+    def __init__(self, service_account_file=None, sheet_id=None, snapshot_file=None):
+        """ Initialize the sheet connector. snapshot_file defaults to cf.SHEET_SNAPSHOT_FILE. """
         self.service_account_file = service_account_file or os.path.join(cf.SERVICE_ACCOUNT_FILE)
         self.sheet_id = sheet_id or cf.SHEET_ID
         self.client = None
+        self.spreadsheet = None
         self.sheet = None
-        self.scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+        self._worksheets = {}
+        self._snapshots = {}  # (sheet_name, columns) -> rows (list of lists, padded to the same width)
+        self._video_indexes = {}  # sheet_name -> (snapshot rows, {video_name: [row_idx, ...]})
+        self._lock = threading.RLock()
+        self.api_calls = 0
+        self.offline = False
+        if cf.SHEET_WRITE_BACK:
+            self.scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+        else:
+            self.scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
         self.detail_rule = 'E'
         self.test_case_id = 'F'
         self.test_case_description = 'G'
@@ -30,6 +65,18 @@ class GoogleSheetConnector:
         self.event_end_time_colum = 'N'
         self.expected_status_column = 'O'
         self.expected_result_column = 'P'
+        # Column span read for test case sheets (notes beyond it are never downloaded)
+        self.test_case_columns = (self.detail_rule, self.expected_result_column)
+        # Columns written by update_results
+        self.result_columns = {
+            'result': cf.SHEET_RESULT_COLUMN,
+            'note': cf.SHEET_RESULT_NOTE_COLUMN,
+            'date': cf.SHEET_RESULT_DATE_COLUMN,
+        }
+
+        snapshot_file = snapshot_file or cf.SHEET_SNAPSHOT_FILE
+        if snapshot_file:
+            self.load_snapshot(snapshot_file)
 
     def connect(self):
         """ Connect to Google Sheets using the provided service account file. """
@@ -37,67 +84,248 @@ class GoogleSheetConnector:
         self.client = gspread.authorize(credentials)
         return self.client
 
+    def open_spreadsheet(self):
+        """ Open the spreadsheet once and keep the handle for the run. """
+        with self._lock:
+            if self.spreadsheet is None:
+                if self.client is None:
+                    self.connect()
+                self.spreadsheet = self._call_with_backoff(self.client.open_by_key, self.sheet_id)
+            return self.spreadsheet
+
     def open_sheet(self, sheet_name):
-        """ Open a specific sheet by name. """
-        if self.client is None:
-            self.connect()
-        spreadsheet = self.client.open_by_key(self.sheet_id)
-        self.sheet = spreadsheet.worksheet(sheet_name)
-        return self.sheet
+        """ Open a specific sheet by name (worksheet handle is cached). """
+        with self._lock:
+            if sheet_name not in self._worksheets:
+                self._worksheets[sheet_name] = self._call_with_backoff(self.open_spreadsheet().worksheet, sheet_name)
+            self.sheet = self._worksheets[sheet_name]
+            return self.sheet
+
+    def _call_with_backoff(self, func, *args, **kwargs):
+        """ Call the Sheets API, waiting and retrying on quota (429) and server (5xx) errors. """
+        attempt = 0
+        while True:
+            try:
+                self.api_calls += 1
+                return func(*args, **kwargs)
+            except APIError as e:
+                status = e.response.status_code if e.response is not None else None
+                if (status != 429 and (status is None or status < 500)) or attempt >= cf.SHEETS_QUOTA_RETRIES:
+                    raise
+                retry_after = e.response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else \
+                    min(cf.SHEETS_BACKOFF_SECONDS * (2 ** attempt), cf.SHEETS_BACKOFF_MAX_SECONDS) * (0.5 + random.random())
+                attempt += 1
+                logger.warning(f"Sheets API HTTP {status}, retry {attempt}/{cf.SHEETS_QUOTA_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _col_index(col):
+        """ "A" -> 0, "AA" -> 26 """
+        index = 0
+        for ch in col.upper():
+            index = index * 26 + ord(ch) - ord('A') + 1
+        return index - 1
+
+    @staticmethod
+    def _range_name(sheet_name, columns):
+        if columns is None:
+            return absolute_range_name(sheet_name)
+        first, last = columns
+        return absolute_range_name(sheet_name, f"{first}1:{last}")
+
+    def _to_rows(self, values, columns):
+        """ Rows padded to the same width; projected rows are shifted back to their sheet column index. """
+        if columns is None:
+            return fill_gaps(values or [[]])
+        offset = self._col_index(columns[0])
+        width = self._col_index(columns[1]) + 1
+        return [[''] * offset + row + [''] * (width - offset - len(row)) for row in values] or [[''] * width]
+
+    def preload(self, sheet_names, test_case_sheets=()):
+        """
+        Fetch every given sheet not yet in the snapshot with one values batch-get
+        Args:
+            sheet_names: Sheets read whole (config sheets), duplicates are ignored
+            test_case_sheets: Sheets read through test case accessors (only test_case_columns fetched)
+        """
+        with self._lock:
+            keys = [(name, None) for name in sheet_names] + [(name, self.test_case_columns) for name in test_case_sheets]
+            missing = [key for key in dict.fromkeys(keys) if key not in self._snapshots]
+            if not missing or self.offline:
+                return
+            try:
+                response = self._call_with_backoff(
+                    self.open_spreadsheet().values_batch_get, [self._range_name(*key) for key in missing])
+            except APIError as e:
+                # e.g. one sheet name does not exist: let each accessor fetch (and fail) on its own
+                logger.warning(f"Batch preload of {len(missing)} sheets failed, falling back to per-sheet reads: {e}")
+                return
+            # valueRanges come back in request order
+            for key, value_range in zip(missing, response.get('valueRanges', [])):
+                self._snapshots[key] = self._to_rows(value_range.get('values', []), key[1])
+            logger.info(f"Preloaded {len(missing)} sheets in one batch ({self.api_calls} Sheets API calls so far)")
+
+    def get_sheet_values(self, sheet_name, columns=None):
+        """
+        Values of a sheet from the snapshot, fetched on first use. Do not modify the result.
+        columns: optional (first, last) column letters to fetch, other columns are returned empty
+        """
+        key = (sheet_name, columns)
+        with self._lock:
+            if key not in self._snapshots and self.offline:
+                self._snapshots[key] = self._offline_values(sheet_name, columns)
+            if key not in self._snapshots:
+                response = self._call_with_backoff(self.open_spreadsheet().values_get,
+                                                   self._range_name(sheet_name, columns))
+                self._snapshots[key] = self._to_rows(response.get('values', []), columns)
+                logger.debug(f"Sheet snapshot '{sheet_name}' {columns or ''}: {len(self._snapshots[key])} rows "
+                             f"({self.api_calls} Sheets API calls so far)")
+            return self._snapshots[key]
+
+    def _offline_values(self, sheet_name, columns):
+        """ Projection of a whole sheet stored in the snapshot file, for a (sheet, columns) not stored as is. """
+        full = self._snapshots.get((sheet_name, None))
+        if full is None:
+            raise KeyError(f"Sheet '{sheet_name}' is not in the offline snapshot")
+        first, last = self._col_index(columns[0]), self._col_index(columns[1]) + 1
+        return [[''] * first + row[first:last] + [''] * (last - first - len(row[first:last])) for row in full]
+
+    def export_snapshot(self, path):
+        """
+        Write every sheet currently in the snapshot to a gzip JSON file
+        Output is deterministic (sorted, no timestamps in the gzip header) so the same inputs give the same bytes.
+        """
+        with self._lock:
+            sheets = [{'name': name, 'columns': list(columns) if columns else None, 'values': values}
+                      for (name, columns), values in sorted(self._snapshots.items(),
+                                                            key=lambda item: (item[0][0], item[0][1] or ()))]
+        payload = json.dumps({'sheet_id': self.sheet_id, 'sheets': sheets},
+                             ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as raw, gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        logger.info(f"Exported {len(sheets)} sheets to {path} ({len(payload) / 1024:.1f} KB uncompressed)")
+        return path
+
+    def load_snapshot(self, path):
+        """ Serve sheets from a file written by export_snapshot, no Sheets API calls are made afterwards. """
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        with self._lock:
+            self._snapshots = {(sheet['name'], tuple(sheet['columns']) if sheet['columns'] else None): sheet['values']
+                               for sheet in data.get('sheets', [])}
+            self._video_indexes.clear()
+            self.offline = True
+        if data.get('sheet_id') and self.sheet_id and data['sheet_id'] != self.sheet_id:
+            logger.warning(f"Sheet snapshot {path} was exported from another spreadsheet ({data['sheet_id']})")
+        logger.info(f"Loaded offline sheet snapshot {path}: {len(self._snapshots)} sheets")
+
+    def get_test_case_values(self, sheet_name):
+        """ Test case sheet values, only test_case_columns are fetched. """
+        return self.get_sheet_values(sheet_name, self.test_case_columns)
+
+    def refresh(self, sheet_name=None):
+        """ Drop the snapshot of one sheet (or all sheets) so the next access reads it again. """
+        with self._lock:
+            if self.offline:
+                logger.debug("Offline sheet snapshot, nothing to refresh")
+                return
+            if sheet_name is None:
+                self._snapshots.clear()
+                self._worksheets.clear()
+                self.spreadsheet = None
+            else:
+                for key in [k for k in self._snapshots if k[0] == sheet_name]:
+                    del self._snapshots[key]
+                self._worksheets.pop(sheet_name, None)
 
     def get_all_records(self, sheet_name):
         """ Retrieve all records from the specified sheet as a list of dictionaries. """
-        sheet = self.open_sheet(sheet_name)
-        return sheet.get_all_records()
+        data = self.get_sheet_values(sheet_name)
+        if not data:
+            return []
+        headers = data[0]
+        return [dict(zip(headers, numericise_all(row))) for row in data[1:]]
 
     def get_filled_blank_merged_cell(self, sheet_name):
         """Get all data of sheet, automatically fill blank cells in merged cell area"""
-        sheet = self.open_sheet(sheet_name)
-        data = sheet.get_all_values()
+        data = self.get_sheet_values(sheet_name)
 
         headers = data[0]
         rows = data[1:]
-
-        # Fill empty cells vertically (like merged cell)
-        for col_idx in range(len(headers)):
-            last_value = None
-            for row_idx in range(len(rows)):
-                cell = rows[row_idx][col_idx]
-                if cell:
-                    last_value = cell
-                else:
-                    rows[row_idx][col_idx] = last_value
-
-        filled_data = [dict(zip(headers, row)) for row in rows]
+        if not rows:
+            return []
+
+        # Fill empty cells vertically (like merged cell): for each cell take the value of the
+        # last non-empty row above it, found with a running max of non-empty row indexes per column
+        values = np.array(rows, dtype=object)
+        row_ids = np.where(values != '', np.arange(len(rows))[:, None], -1)
+        np.maximum.accumulate(row_ids, axis=0, out=row_ids)
+        # -1 (nothing above) picks the appended row of None
+        values = np.vstack([values, np.full((1, values.shape[1]), None, dtype=object)])
+        filled = values[row_ids, np.arange(values.shape[1])]
+
+        filled_data = [dict(zip(headers, row)) for row in filled.tolist()]
         return filled_data
 
     def get_values(self, sheet_name, cell_range):
         """
         Retrieve raw cell values from a given range.
-        param cell_range: A1 notation range (e.g., "A1:C10").
+        param cell_range: A1 notation range (e.g., "A1:C10", "H2:H").
         """
-        sheet = self.open_sheet(sheet_name)
-        return sheet.get(cell_range)
+        return self._slice_range(self.get_sheet_values(sheet_name), cell_range)
+
+    @classmethod
+    def _slice_range(cls, data, cell_range):
+        (start_row, start_col), (end_row, end_col) = cls._parse_a1_range(cell_range)
+        values = [row[start_col:end_col] for row in data[start_row:end_row]]
+
+        # Same shape as the Sheets API: trailing empty cells and rows are trimmed
+        values = [row[:max((i + 1 for i, v in enumerate(row) if v != ''), default=0)] for row in values]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    @classmethod
+    def _parse_a1_range(cls, cell_range):
+        """ "B2:D" -> ((1, 1), (None, 4)) as 0-based start and exclusive end, None means unbounded. """
+        def parse(ref, is_end):
+            match = re.fullmatch(r'([A-Za-z]*)(\d*)', ref.strip())
+            if match is None:
+                raise ValueError(f"Invalid A1 range: {cell_range}")
+            letters, digits = match.groups()
+            col = None
+            if letters:
+                col = cls._col_index(letters) + (1 if is_end else 0)
+            row = (int(digits) if is_end else int(digits) - 1) if digits else None
+            return row, col
+
+        start, _, end = cell_range.split('!')[-1].partition(':')
+        start_row, start_col = parse(start, False)
+        end_row, end_col = parse(end, True) if end else (start_row + 1 if start_row is not None else None,
+                                                         start_col + 1 if start_col is not None else None)
+        return (start_row or 0, start_col or 0), (end_row, end_col)
 
     def get_all_video_names(self, sheet_name):
         """ Get all video names from the sheet. """
-        sheet = self.open_sheet(sheet_name)
         col_range = f"{self.video_name_colum}2:{self.video_name_colum}"
-        values = sheet.get(col_range)
+        values = self._slice_range(self.get_test_case_values(sheet_name), col_range)
         return [v[0] for v in values if v]
 
     def get_videos_with_camera(self, sheet_name):
         """
         Get video names with camera names
-        Returns: List[Dict] with keys: video_name, camera_name
+        Returns: List[Dict] with keys: video_name, camera_name, expected_status
         """
-        sheet = self.open_sheet(sheet_name)
-
         # Get video column (H) and camera column (I)
         video_col_idx = ord(self.video_name_colum) - ord('A')
         camera_col_idx = ord(self.camera_name_colum) - ord('A')
+        status_col_idx = ord(self.expected_status_column) - ord('A')
 
-        all_values = sheet.get_all_values()
+        all_values = self.get_test_case_values(sheet_name)
         rows = all_values[1:]  # Skip header
 
         videos_info = []
@@ -111,31 +339,48 @@ class GoogleSheetConnector:
             if video_name:  # Only add if video_name exists
                 videos_info.append({
                     'video_name': video_name,
-                    'camera_name': camera_name
+                    'camera_name': camera_name,
+                    'expected_status': row[status_col_idx].strip() if len(row) > status_col_idx else ''
                 })
 
         return videos_info
 
+    def _video_row_index(self, sheet_name):
+        """ {stripped video name: [row indexes in the test case values]}, rebuilt when the snapshot changes. """
+        all_values = self.get_test_case_values(sheet_name)
+        with self._lock:
+            cached = self._video_indexes.get(sheet_name)
+            if cached is not None and cached[0] is all_values:
+                return cached[1]
+
+            video_col_idx = self._col_index(self.video_name_colum)
+            index = {}
+            for row_idx in range(1, len(all_values)):
+                row = all_values[row_idx]
+                if len(row) > video_col_idx and row[video_col_idx].strip():
+                    index.setdefault(row[video_col_idx].strip(), []).append(row_idx)
+            self._video_indexes[sheet_name] = (all_values, index)
+            return index
+
     def get_info_row_by_video_name(self, sheet_name, video_name):
-        """ Get all related information in the same row as the given video name. """
-        sheet = self.open_sheet(sheet_name)
-        all_values = sheet.get_all_values()
+        """ Get all related information (test case columns) in the same row as the given video name. """
+        all_values = self.get_test_case_values(sheet_name)
+        first = self._col_index(self.test_case_columns[0])
         headers = all_values[0]
-        rows = all_values[1:]
-
-        for row in rows:
-            if len(row) > 7 and row[7].strip() == video_name.strip():
-                return dict(zip(headers, row))
 
-        return None
+        row_indexes = self._video_row_index(sheet_name).get(video_name.strip())
+        if not row_indexes:
+            return None
+        row = all_values[row_indexes[0]]
+        return dict(zip(headers[first:], row[first:]))
 
     def get_info_rows_by_video_names(self, sheet_name, video_names):
-        sheet = self.open_sheet(sheet_name)
-        all_values = sheet.get_all_values()
+        all_values = self.get_test_case_values(sheet_name)
         headers = all_values[0]
-        rows = all_values[1:]
 
-        video_names = [v.strip() for v in video_names if v]
+        index = self._video_row_index(sheet_name)
+        # Sheet order, like a full scan
+        row_indexes = sorted({i for v in video_names if v for i in index.get(v.strip(), [])})
 
         def col_to_index(col):
             return ord(col.upper()) - ord('A')
@@ -155,26 +400,150 @@ class GoogleSheetConnector:
         needed_indexes = [col_to_index(c) for c in needed_columns]
 
         matched_rows = []
-        for row in rows:
-            if len(row) > 7 and row[7].strip() in video_names:
-                filtered_data = {}
-                for col, idx in zip(needed_columns, needed_indexes):
-                    if idx < len(headers):
-                        header = headers[idx]
-                        value = row[idx].strip() if idx < len(row) and row[idx] else ""
-
-                        # Nếu đây là cột expected_result_column → parse JSON
-                        if col == self.expected_result_column and value:
-                            try:
-                                value = json.loads(value)
-                            except json.JSONDecodeError:
-                                pass  # giữ nguyên nếu không parse được
-
-                        filtered_data[header] = value
-                matched_rows.append(filtered_data)
+        for row_idx in row_indexes:
+            row = all_values[row_idx]
+            filtered_data = {}
+            for col, idx in zip(needed_columns, needed_indexes):
+                if idx < len(headers):
+                    header = headers[idx]
+                    value = row[idx].strip() if idx < len(row) and row[idx] else ""
+
+                    # Nếu đây là cột expected_result_column → parse JSON
+                    if col == self.expected_result_column and value:
+                        try:
+                            value = json.loads(value)
+                        except json.JSONDecodeError:
+                            pass  # giữ nguyên nếu không parse được
+
+                    filtered_data[header] = value
+            matched_rows.append(filtered_data)
 
         return matched_rows
 
+    def _test_case_columns(self):
+        """ {TestCase field: column letter} """
+        return {
+            'test_case_id': self.test_case_id,
+            'description': self.test_case_description,
+            'video_name': self.video_name_colum,
+            'camera_name': self.camera_name_colum,
+            'start_time': self.start_time_colum,
+            'end_time': self.end_time_colum,
+            'event_start_time': self.event_start_time_colum,
+            'event_end_time': self.event_end_time_colum,
+            'expected_status': self.expected_status_column,
+            'expected_result': self.expected_result_column,
+        }
+
+    def _check_test_case_headers(self, sheet_name, headers):
+        """
+        Raise TestCaseSheetError when a column the validation depends on has an unexpected header
+        (typo or shifted columns), warn for descriptive columns.
+        """
+        required = ('video_name', 'event_start_time', 'event_end_time', 'expected_status', 'expected_result')
+        optional = ('test_case_id', 'description')
+        columns = self._test_case_columns()
+        errors = []
+        for field in required + optional:
+            col = columns[field]
+            idx = self._col_index(col)
+            actual = headers[idx].strip() if idx < len(headers) else ''
+            expected = TestCase.HEADERS[field]
+            if actual == expected:
+                continue
+            message = f"column {col} header is '{actual}', expected '{expected}'"
+            if field in required:
+                errors.append(message)
+            else:
+                logger.warning(f"Sheet '{sheet_name}': {message}")
+        if errors:
+            raise TestCaseSheetError(f"Sheet '{sheet_name}': " + '; '.join(errors))
+
+    def get_test_cases_by_video_names(self, sheet_name, video_names):
+        """
+        Test cases of the given videos as TestCase objects (sheet order), parsed once here.
+        Cells are read by column letter; headers are checked so a typo fails loudly instead of reading ''.
+        """
+        all_values = self.get_test_case_values(sheet_name)
+        self._check_test_case_headers(sheet_name, all_values[0])
+
+        columns = {field: self._col_index(col) for field, col in self._test_case_columns().items()}
+        result_idx = columns.pop('expected_result')
+        index = self._video_row_index(sheet_name)
+        row_indexes = sorted({i for v in video_names if v for i in index.get(v.strip(), [])})
+
+        test_cases = []
+        for row_idx in row_indexes:
+            row = all_values[row_idx]
+            values = {field: row[idx] if idx < len(row) else '' for field, idx in columns.items()}
+            test_cases.append(TestCase.from_values(values, row[result_idx] if result_idx < len(row) else ''))
+        return test_cases
+
+    def update_results(self, sheet_name, results):
+        """
+        Write test results back to the sheet with one batched update, only cells whose value changed.
+        Rows are found through the video name index (every row of a duplicated video is written).
+        A result column whose header is already used for something else is left untouched.
+        Args:
+            results: {video_name: {'result': 'PASSED', 'note': '...', 'date': '2025-01-01 10:00:00'}}
+        Returns:
+            Number of cells written
+        """
+        if self.offline:
+            logger.info(f"Offline sheet snapshot, results not written to '{sheet_name}'")
+            return 0
+
+        col_indexes = {field: self._col_index(col) for field, col in self.result_columns.items()}
+        letters = sorted(self.result_columns.values(), key=self._col_index)
+        current = self.get_sheet_values(sheet_name, (letters[0], letters[-1]))
+        row_index = self._video_row_index(sheet_name)
+
+        def current_value(row_idx, col_idx):
+            row = current[row_idx] if row_idx < len(current) else []
+            return row[col_idx] if col_idx < len(row) else ''
+
+        updates = {}  # (row_idx, col_idx) -> value, row 0 is the header
+        usable = {}
+        for field, col_idx in col_indexes.items():
+            header = current_value(0, col_idx)
+            if header and header != RESULT_HEADERS[field]:
+                logger.error(f"Column {self.result_columns[field]} of '{sheet_name}' is '{header}', "
+                             f"not writing {field} there")
+                continue
+            usable[field] = col_idx
+            if not header:
+                updates[(0, col_idx)] = RESULT_HEADERS[field]
+
+        not_found = []
+        for video_name, values in results.items():
+            row_indexes = row_index.get(video_name.strip())
+            if not row_indexes:
+                not_found.append(video_name)
+                continue
+            for row_idx in row_indexes:
+                for field, value in values.items():
+                    if field not in usable:
+                        continue
+                    value = '' if value is None else str(value)
+                    if current_value(row_idx, usable[field]) != value:
+                        updates[(row_idx, usable[field])] = value
+
+        if not_found:
+            logger.warning(f"Sheet '{sheet_name}': {len(not_found)} videos not found for write-back: {not_found[:5]}")
+        if not updates:
+            logger.info(f"Sheet '{sheet_name}': results unchanged, nothing to write")
+            return 0
+
+        data = [{'range': absolute_range_name(sheet_name, rowcol_to_a1(row_idx + 1, col_idx + 1)), 'values': [[value]]}
+                for (row_idx, col_idx), value in sorted(updates.items())]
+        with self._lock:
+            self._call_with_backoff(self.open_spreadsheet().values_batch_update,
+                                    body={'valueInputOption': 'RAW', 'data': data})
+            # Read the result columns again next time instead of patching the snapshot
+            self._snapshots.pop((sheet_name, (letters[0], letters[-1])), None)
+        logger.info(f"Sheet '{sheet_name}': wrote {len(updates)} changed cells for {len(results)} test cases")
+        return len(updates)
+
 
 if __name__ == '__main__':
     sheet_connector = GoogleSheetConnector(cf.SERVICE_ACCOUNT_FILE, cf.SHEET_ID)
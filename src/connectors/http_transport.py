@@ -0,0 +1,271 @@
+"""HTTP Transport - Shared pooled session with retries, a global retry budget and circuit breaking"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without calling the server while its circuit is open"""
+
+
+class RetryBudget:
+    """Global number of retries allowed for the whole run, shared by every client"""
+
+    def __init__(self, max_retries: int = cf.HTTP_RETRY_BUDGET):
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Open after `failure_threshold` consecutive failures, reject calls for `reset_timeout` seconds,
+    then let one trial call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = cf.HTTP_CIRCUIT_FAILURES,
+                 reset_timeout: float = cf.HTTP_CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._half_open_trial = False
+        self._trial_owner = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._half_open_trial:
+                return False
+            self._half_open_trial = True
+            self._trial_owner = threading.get_ident()
+            return True
+
+    def release_trial(self):
+        """
+        End this thread's half-open trial if it was neither a success nor a failure (e.g. a 429 or an
+        unexpected error), so the next call can try again instead of the host staying locked out
+        """
+        with self._lock:
+            if self._half_open_trial and self._trial_owner == threading.get_ident():
+                self._half_open_trial = False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit closed: {self.name}")
+            self.failures = 0
+            self.opened_at = None
+            self._half_open_trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._half_open_trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.error(f"Circuit opened: {self.name} ({self.failures} consecutive failures), "
+                             f"failing fast for {self.reset_timeout}s")
+                self.opened_at = time.monotonic()
+            self._half_open_trial = False
+
+
+class RequestMetrics:
+    """
+    Per-endpoint call log: status, bytes sent/received and wall time of every attempt.
+    Streamed responses are recorded when their headers arrive (no body bytes yet); the body is added
+    with record_body once consumed (HttpTransport.iter_content), so throughput covers the whole transfer.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, List[Dict]] = {}
+        self._bodies: Dict[str, List[Tuple[int, float]]] = {}  # endpoint -> [(bytes, seconds)] of streamed bodies
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, status, bytes_sent: int, bytes_received: int, seconds: float):
+        with self._lock:
+            self._calls.setdefault(endpoint, []).append({
+                "status": status,
+                "bytes_sent": bytes_sent,
+                "bytes_received": bytes_received,
+                "seconds": seconds,
+            })
+
+    def record_body(self, endpoint: str, bytes_received: int, seconds: float):
+        with self._lock:
+            self._bodies.setdefault(endpoint, []).append((bytes_received, seconds))
+
+    @staticmethod
+    def _percentile(sorted_values: List[float], percent: float) -> float:
+        index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+        return sorted_values[index]
+
+    def summary(self) -> Dict[str, Dict]:
+        """{endpoint: {calls, errors, p50_ms, p95_ms, max_ms, bytes_sent, bytes_received, bytes_per_s}}"""
+        with self._lock:
+            calls = {endpoint: list(items) for endpoint, items in self._calls.items()}
+            bodies = {endpoint: list(items) for endpoint, items in self._bodies.items()}
+
+        result = {}
+        for endpoint, items in sorted(calls.items()):
+            latencies = sorted(c["seconds"] for c in items)
+            # Latency percentiles are time to response headers; throughput also counts streamed body transfers
+            total_seconds = sum(latencies) + sum(seconds for _, seconds in bodies.get(endpoint, []))
+            bytes_sent = sum(c["bytes_sent"] for c in items)
+            bytes_received = sum(c["bytes_received"] for c in items) + sum(n for n, _ in bodies.get(endpoint, []))
+            errors = sum(1 for c in items if c["status"] == "error" or (isinstance(c["status"], int) and c["status"] >= 400))
+            result[endpoint] = {
+                "calls": len(items),
+                "errors": errors,
+                "p50_ms": round(self._percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(self._percentile(latencies, 95) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1),
+                "total_seconds": round(total_seconds, 2),
+                "bytes_sent": bytes_sent,
+                "bytes_received": bytes_received,
+                "bytes_per_s": round((bytes_sent + bytes_received) / total_seconds, 1) if total_seconds > 0 else 0.0,
+            }
+        return result
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+def _response_size(response: requests.Response, stream: bool) -> int:
+    # A streamed body is not read yet, its bytes are recorded by HttpTransport.iter_content
+    return 0 if stream else len(response.content)
+
+
+request_metrics = RequestMetrics()
+_retry_budget = RetryBudget()
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(base_url: str) -> CircuitBreaker:
+    """One breaker per host, shared by every transport talking to it"""
+    host = urlparse(base_url).netloc or base_url
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+class HttpTransport:
+    """Pooled requests session used by AIAPIClient and FileBrowserAPIClient"""
+
+    def __init__(self, base_url: str, pool_size: int = cf.HTTP_POOL_SIZE,
+                 endpoint_retries: Optional[Dict[str, int]] = None,
+                 default_retries: int = cf.HTTP_RETRIES, backoff: float = cf.HTTP_BACKOFF_SECONDS,
+                 retry_budget: RetryBudget = None):
+        """
+        Args:
+            base_url: Server base URL (the circuit breaker is shared per host)
+            pool_size: Max pooled connections kept to the host
+            endpoint_retries: {endpoint_path: retries}, overrides default_retries per endpoint
+            default_retries: Retries for endpoints not listed in endpoint_retries
+            backoff: Base backoff seconds, doubled on each retry (with jitter)
+            retry_budget: Shared budget, defaults to the global one
+        """
+        self.base_url = base_url.rstrip('/')
+        self.endpoint_retries = endpoint_retries or {}
+        self.default_retries = default_retries
+        self.backoff = backoff
+        self.retry_budget = retry_budget or _retry_budget
+        self.breaker = get_circuit_breaker(self.base_url)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method: str, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        """
+        Send request with retry on connection errors, timeouts and 429/5xx responses
+        Returns the last response (callers still call raise_for_status)
+        """
+        retries = self.endpoint_retries.get(endpoint, self.default_retries)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {self.breaker.name}, skip {method} {url}")
+
+            metrics_key = f"{method} {endpoint or urlparse(url).path}"
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                request_metrics.record(metrics_key, "error", 0, 0, time.perf_counter() - start)
+                self.breaker.record_failure()
+                if not self._can_retry(attempt, retries, method, url, str(e)):
+                    raise
+            except requests.RequestException:
+                request_metrics.record(metrics_key, "error", 0, 0, time.perf_counter() - start)
+                self.breaker.record_failure()
+                raise
+            else:
+                request_metrics.record(metrics_key, response.status_code, _body_size(response.request.body),
+                                       _response_size(response, kwargs.get('stream', False)),
+                                       time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                if not self._can_retry(attempt, retries, method, url, f"HTTP {response.status_code}"):
+                    return response
+                # Give the pooled connection back (streamed bodies hold it until read or closed)
+                response.close()
+            finally:
+                self.breaker.release_trial()
+
+            attempt += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    @staticmethod
+    def iter_content(response: requests.Response, endpoint: str, chunk_size: int,
+                     method: str = 'GET') -> Iterator[bytes]:
+        """Iterate a streamed response body, recording its bytes and transfer time for the endpoint"""
+        received = 0
+        start = time.perf_counter()
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                received += len(chunk)
+                yield chunk
+        finally:
+            request_metrics.record_body(f"{method} {endpoint}", received, time.perf_counter() - start)
+
+    def _can_retry(self, attempt: int, retries: int, method: str, url: str, reason: str) -> bool:
+        if attempt >= retries:
+            return False
+        if not self.retry_budget.try_acquire():
+            logger.warning(f"Retry budget exhausted, not retrying {method} {url}: {reason}")
+            return False
+        logger.warning(f"{method} {url} failed ({reason}), retry {attempt + 1}/{retries}")
+        return True
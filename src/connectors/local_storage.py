@@ -0,0 +1,106 @@
+"""Local Video Storage - Stand-in for SMBConnector that reads videos from a local directory"""
+import os
+import logging
+import shutil
+from typing import Dict, Optional, List, Tuple
+
+from config.settings import cf
+from src.connectors.smb_storage import sampled_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVideoStorage:
+    """
+    Same interface as SMBConnector, over a local copy of the share: <root_dir>/<tenant_dir>/<rule>/<video>.
+    Used by offline runs (see src.utils.offline_run) so phase 1 needs no SMB server.
+    """
+
+    def __init__(self, root_dir: str = cf.LOCAL_VIDEO_DIR):
+        self.root_dir = root_dir
+        self._connected = False
+
+    def connect(self) -> bool:
+        self._connected = os.path.isdir(self.root_dir)
+        if self._connected:
+            logger.info(f"Using local videos from {self.root_dir}")
+        else:
+            logger.error(f"Local video directory not found: {self.root_dir}")
+        return self._connected
+
+    def _build_path(self, _dir: str, filename: str = "") -> str:
+        return os.path.join(self.root_dir, _dir, filename)
+
+    def get_video(self, _dir: str, video_name: str) -> Optional[bytes]:
+        try:
+            with open(self._build_path(_dir, video_name), 'rb') as f:
+                return f.read()
+        except OSError as e:
+            logger.error(f"Read error {video_name}: {e}")
+            return None
+
+    def get_video_by_list(self, _dir, list_video_names: List[str], max_workers: int = 1) -> list:
+        """ [(video_name, bytes or None), ...] """
+        return [(video_name, self.get_video(_dir, video_name)) for video_name in list_video_names]
+
+    def download_video_to_file(self, _dir: str, video_name: str, target_path: str) -> Optional[str]:
+        try:
+            shutil.copyfile(self._build_path(_dir, video_name), target_path)
+            return target_path
+        except OSError as e:
+            logger.error(f"Copy error {video_name}: {e}")
+            return None
+
+    def get_video_files_by_list(self, _dir, list_video_names: List[str], target_dir: str,
+                                max_workers: int = 1) -> list:
+        """ [(video_name, local_path or None), ...] """
+        return [(video_name, self.download_video_to_file(_dir, video_name,
+                                                         os.path.join(target_dir, os.path.basename(video_name))))
+                for video_name in list_video_names]
+
+    def get_video_stats(self, _dir: str, list_video_names: List[str]) -> Dict[str, Tuple[int, float]]:
+        stats = {}
+        for video_name in list_video_names:
+            try:
+                st = os.stat(self._build_path(_dir, video_name))
+            except OSError:
+                continue
+            stats[video_name] = (st.st_size, st.st_mtime)
+        return stats
+
+    def get_video_fingerprints(self, _dir: str, list_video_names: List[str],
+                               max_workers: int = 1) -> Dict[str, Optional[str]]:
+        fingerprints = {}
+        for video_name in list_video_names:
+            try:
+                path = self._build_path(_dir, video_name)
+                with open(path, 'rb') as f:
+                    fingerprints[video_name] = sampled_fingerprint(f, os.path.getsize(path))
+            except OSError as e:
+                logger.error(f"Fingerprint error {video_name}: {e}")
+                fingerprints[video_name] = None
+        return fingerprints
+
+    def video_exists(self, _dir: str, video_name: str) -> bool:
+        return os.path.isfile(self._build_path(_dir, video_name))
+
+    def list_files(self, _dir: str) -> List[str]:
+        try:
+            return [f for f in os.listdir(self._build_path(_dir)) if not f.startswith('.')]
+        except OSError as e:
+            logger.error(f"List files error: {e}")
+            return []
+
+    def get_file_size(self, _dir: str, video_name: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._build_path(_dir, video_name))
+        except OSError as e:
+            logger.error(f"Get size error: {e}")
+            return None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *args):
+        pass
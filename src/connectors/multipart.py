@@ -0,0 +1,122 @@
+"""Multipart Stream - Build multipart/form-data bodies without loading files into memory"""
+import io
+import os
+import uuid
+from typing import List, Tuple, Union, BinaryIO, Iterator, Optional
+
+VideoSource = Union[bytes, str, os.PathLike, BinaryIO]
+
+
+class MultipartFileStream:
+    """
+    File-like multipart/form-data body for requests
+    Sources are read chunk by chunk while the request is sent, so memory stays flat.
+    Each source can be bytes, a file path or a seekable binary file-like object. File-like sources
+    are always sent from their start, so a retried upload built from the same sources resends whole files.
+    """
+
+    def __init__(self, field_name: str, files: List[Tuple[str, VideoSource]],
+                 content_type: str = 'video/mp4', chunk_size: int = 1024 * 1024):
+        for filename, source in files:
+            if not isinstance(source, (bytes, bytearray, str, os.PathLike)) and not self._seekable(source):
+                raise ValueError(f"Source of {filename} is not seekable, it could not be resent on retry")
+        self.field_name = field_name
+        self.files = files
+        self.file_content_type = content_type
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        self._chunks = self._iter_chunks()
+        self._buffer = bytearray()
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @staticmethod
+    def _seekable(source) -> bool:
+        try:
+            return source.seekable()
+        except (AttributeError, ValueError):
+            return False
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        """Escape a Content-Disposition parameter value (line breaks would end the header)"""
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\r', ' ').replace('\n', ' ')
+
+    def _part_header(self, filename: str) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{self._quote(self.field_name)}"; '
+            f'filename="{self._quote(filename)}"\r\n'
+            f"Content-Type: {self.file_content_type}\r\n\r\n"
+        ).encode('utf-8')
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode('utf-8')
+
+    @staticmethod
+    def source_size(source: VideoSource) -> Optional[int]:
+        """Size in bytes of a source, None if it cannot be known without reading"""
+        if isinstance(source, (bytes, bytearray)):
+            return len(source)
+        if isinstance(source, (str, os.PathLike)):
+            return os.path.getsize(source)
+        try:
+            position = source.tell()
+            size = source.seek(0, io.SEEK_END)
+            source.seek(position)
+            return size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+
+    def __len__(self) -> int:
+        """Total body length, 0 when unknown (requests then uses chunked transfer encoding)"""
+        total = len(self._closing())
+        for filename, source in self.files:
+            size = self.source_size(source)
+            if size is None:
+                return 0
+            total += len(self._part_header(filename)) + size + 2
+        return total
+
+    def _iter_source(self, source: VideoSource) -> Iterator[bytes]:
+        if isinstance(source, (bytes, bytearray)):
+            for start in range(0, len(source), self.chunk_size):
+                yield bytes(source[start:start + self.chunk_size])
+        elif isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                yield from iter(lambda: f.read(self.chunk_size), b'')
+        else:
+            source.seek(0)
+            yield from iter(lambda: source.read(self.chunk_size), b'')
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        for filename, source in self.files:
+            yield self._part_header(filename)
+            yield from self._iter_source(source)
+            yield b'\r\n'
+        yield self._closing()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        chunk = self.read(self.chunk_size)
+        if not chunk:
+            raise StopIteration
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        # bytearray drops a leading slice without copying the remaining buffer
+        del self._buffer[:size]
+        return data
@@ -1,12 +1,36 @@
+import hashlib
 import os
 import logging
-from typing import Optional, List
-from smbclient import register_session, open_file, listdir, stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Optional, List, Tuple
+from smbclient import register_session, reset_connection_cache, open_file, listdir, scandir, stat
 from smbclient.path import exists
 
+from config.settings import cf
+
 logger = logging.getLogger(__name__)
 
 
+def sampled_fingerprint(f: BinaryIO, size: int, sample_size: int = cf.UPLOAD_REGISTRY_SAMPLE_SIZE,
+                        samples: int = 3) -> str:
+    """
+    Fingerprint of a seekable file: size plus sha1 of `samples` chunks spread over the file
+    (start, middle(s), end). Cheap for big videos, stable for identical contents.
+    """
+    digest = hashlib.sha1(str(size).encode())
+    if size <= sample_size * samples:
+        f.seek(0)
+        digest.update(f.read())
+    else:
+        step = (size - sample_size) // (samples - 1)
+        for i in range(samples):
+            f.seek(i * step)
+            digest.update(f.read(sample_size))
+    return f"{size}-{digest.hexdigest()}"
+
+
 class SMBConnector:
     """The class handles connecting and loading video from SMB storage"""
 
@@ -50,10 +74,89 @@ class SMBConnector:
             logger.error(f"Download error {video_name}: {e}")
             return None
 
-    def get_video_by_list(self, _dir, list_video_names: List[str]) -> list:
-        """ Get multiple videos from SMB by a list of video names. """
+    def _download_parallel(self, _dir: str, list_video_names: List[str],
+                           download: Callable[[str, str, dict], Tuple[object, int]],
+                           max_workers: int, retries: int = cf.SMB_DOWNLOAD_RETRIES,
+                           action: str = 'downloaded') -> list:
+        """
+        Run download(video_name, path, connection_cache) -> (result, nbytes) for every video in a bounded pool.
+        Each worker thread registers its own SMB session (own connection cache), so transfers run on
+        separate connections instead of sharing one. Each file is retried on its own, a failed file
+        gives (video_name, None). Results keep the input order.
+        """
+        local = threading.local()
+        caches = []
+        caches_lock = threading.Lock()
+
+        def worker_cache() -> dict:
+            cache = getattr(local, 'connection_cache', None)
+            if cache is None:
+                cache = {}
+                register_session(self.server, username=self.username, password=self.password,
+                                 connection_cache=cache)
+                local.connection_cache = cache
+                with caches_lock:
+                    caches.append(cache)
+            return cache
+
+        def drop_worker_cache():
+            cache = getattr(local, 'connection_cache', None)
+            local.connection_cache = None
+            if cache is not None:
+                try:
+                    reset_connection_cache(fail_on_error=False, connection_cache=cache)
+                except Exception as e:
+                    logger.debug(f"SMB session reset error: {e}")
+
+        def task(video_name: str):
+            path = self._build_path(_dir, video_name)
+            for attempt in range(retries + 1):
+                try:
+                    return download(video_name, path, worker_cache())
+                except Exception as e:
+                    # Reconnect on the next attempt, the worker's connection may be broken
+                    drop_worker_cache()
+                    if attempt >= retries:
+                        logger.error(f"Download error {video_name}: {e}")
+                        return None, 0
+                    logger.warning(f"Download error {video_name} ({e}), retry {attempt + 1}/{retries}")
+                    time.sleep(cf.SMB_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='smb_download') as executor:
+                outcomes = list(executor.map(task, list_video_names))
+        finally:
+            for cache in caches:
+                try:
+                    reset_connection_cache(fail_on_error=False, connection_cache=cache)
+                except Exception as e:
+                    logger.debug(f"SMB session reset error: {e}")
+
+        elapsed = time.perf_counter() - start
+        total_bytes = sum(nbytes for _, nbytes in outcomes)
+        failed = sum(1 for result, _ in outcomes if result is None)
+        logger.info(f"SMB {action} {len(outcomes) - failed}/{len(outcomes)} videos, "
+                    f"{total_bytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+                    f"({total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0:.1f} MB/s, {max_workers} workers)")
+        return [(name, result) for name, (result, _) in zip(list_video_names, outcomes)]
+
+    def get_video_by_list(self, _dir, list_video_names: List[str],
+                          max_workers: int = cf.SMB_DOWNLOAD_WORKERS) -> list:
+        """ Get multiple videos from SMB by a list of video names, returns [(video_name, bytes or None), ...] """
         if not self._connected:
             raise ConnectionError("Not connected. Call connect() first")
+
+        if max_workers > 1 and len(list_video_names) > 1:
+            def read_video(video_name: str, path: str, connection_cache: dict):
+                with open_file(path, mode="rb", connection_cache=connection_cache) as f:
+                    data = f.read()
+                logger.info(f"Downloaded {video_name}: {len(data)} bytes")
+                return data, len(data)
+
+            return self._download_parallel(_dir, list_video_names, read_video,
+                                           min(max_workers, len(list_video_names)))
+
         results = []
         for video_name in list_video_names:
             try:
@@ -67,6 +170,85 @@ class SMBConnector:
                 results.append((video_name, None))
         return results
 
+    def download_video_to_file(self, _dir: str, video_name: str, target_path: str,
+                               chunk_size: int = 1024 * 1024) -> Optional[str]:
+        """Copy video from SMB to a local file chunk by chunk, return local path"""
+        if not self._connected:
+            raise ConnectionError("Not connected. Call connect() first")
+
+        try:
+            path = self._build_path(_dir, video_name)
+            size = 0
+            with open_file(path, mode="rb") as src, open(target_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(chunk_size), b''):
+                    dst.write(chunk)
+                    size += len(chunk)
+            logger.info(f"Downloaded {video_name}: {size} bytes -> {target_path}")
+            return target_path
+        except Exception as e:
+            logger.error(f"Download error {video_name}: {e}")
+            return None
+
+    def get_video_files_by_list(self, _dir, list_video_names: List[str], target_dir: str,
+                                max_workers: int = cf.SMB_DOWNLOAD_WORKERS) -> list:
+        """ Download multiple videos into target_dir, returns [(video_name, local_path or None), ...] """
+        if not self._connected:
+            raise ConnectionError("Not connected. Call connect() first")
+
+        if max_workers > 1 and len(list_video_names) > 1:
+            def copy_video(video_name: str, path: str, connection_cache: dict, chunk_size: int = 1024 * 1024):
+                target_path = os.path.join(target_dir, os.path.basename(video_name))
+                size = 0
+                with open_file(path, mode="rb", connection_cache=connection_cache) as src, \
+                        open(target_path, "wb") as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b''):
+                        dst.write(chunk)
+                        size += len(chunk)
+                logger.info(f"Downloaded {video_name}: {size} bytes -> {target_path}")
+                return target_path, size
+
+            return self._download_parallel(_dir, list_video_names, copy_video,
+                                           min(max_workers, len(list_video_names)))
+
+        results = []
+        for video_name in list_video_names:
+            target_path = os.path.join(target_dir, os.path.basename(video_name))
+            results.append((video_name, self.download_video_to_file(_dir, video_name, target_path)))
+        return results
+
+    def get_video_stats(self, _dir: str, list_video_names: List[str]) -> Dict[str, Tuple[int, float]]:
+        """
+        {video_name: (size, mtime)} from one directory listing (no per-file round trip)
+        Videos not found in the listing are left out.
+        """
+        wanted = set(list_video_names)
+        stats = {}
+        try:
+            for entry in scandir(self._build_path(_dir)):
+                if entry.name in wanted and entry.is_file():
+                    st = entry.stat()
+                    stats[entry.name] = (st.st_size, st.st_mtime)
+        except Exception as e:
+            logger.error(f"List error {_dir}: {e}")
+        return stats
+
+    def get_video_fingerprints(self, _dir: str, list_video_names: List[str],
+                               max_workers: int = cf.SMB_DOWNLOAD_WORKERS) -> Dict[str, Optional[str]]:
+        """Content fingerprints (size + sampled hash) read in parallel without downloading whole videos"""
+        if not self._connected:
+            raise ConnectionError("Not connected. Call connect() first")
+        if not list_video_names:
+            return {}
+
+        def fingerprint(video_name: str, path: str, connection_cache: dict):
+            with open_file(path, mode="rb", connection_cache=connection_cache) as f:
+                size = f.seek(0, os.SEEK_END)
+                return sampled_fingerprint(f, size), min(size, cf.UPLOAD_REGISTRY_SAMPLE_SIZE * 3)
+
+        return dict(self._download_parallel(_dir, list_video_names, fingerprint,
+                                            max(1, min(max_workers, len(list_video_names))),
+                                            action='fingerprinted'))
+
     def video_exists(self, _dir: str, video_name: str) -> bool:
         """Check if video exists"""
         try:
@@ -1,12 +1,20 @@
 """Evidence Video Processor - Extract and annotate frames from test videos"""
+import itertools
 import logging
+import shutil
 import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Iterator
 
 import cv2
 
+from config.settings import cf
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,13 +51,17 @@ class BoundingBox:
 class VideoProcessor:
     """Process video: extract frames, draw bounding boxes, analyze metadata"""
 
-    def __init__(self, video_bytes: bytes):
+    def __init__(self, video_bytes: bytes = None, video_path: str = None):
         """
-        Initialize with video bytes
+        Initialize with video bytes or a local video file
         Args:
-            video_bytes: Raw video file bytes
+            video_bytes: Raw video file bytes (written to a temp file on open)
+            video_path: Local video file, opened directly without copying
         """
+        if video_bytes is None and video_path is None:
+            raise ValueError("video_bytes or video_path is required")
         self.video_bytes = video_bytes
+        self.video_path = video_path
         self._tempfile = None
         self._cap = None
         self._video_info = None
@@ -64,19 +76,22 @@ class VideoProcessor:
         self.close()
 
     def _open_video(self):
-        """Open video from bytes"""
+        """Open video from path, or from bytes through a temp file"""
         if self._cap is not None:
             return
 
-        self._tempfile = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        self._tempfile.write(self.video_bytes)
-        self._tempfile.flush()
+        video_path = self.video_path
+        if video_path is None:
+            self._tempfile = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+            self._tempfile.write(self.video_bytes)
+            self._tempfile.flush()
+            video_path = self._tempfile.name
 
-        self._cap = cv2.VideoCapture(self._tempfile.name)
+        self._cap = cv2.VideoCapture(video_path)
         if not self._cap.isOpened():
             raise ValueError("Failed to open video")
 
-        logger.debug(f"Video opened: {self._tempfile.name}")
+        logger.debug(f"Video opened: {video_path}")
 
     def close(self):
         """Release resources"""
@@ -357,6 +372,8 @@ class EvidenceVideoProcessor:
         total_validations = len(validation_results)
         logger.info(f"Processing {total_validations} validation results for evidence images")
 
+        # 1. Collect frames to draw per evidence video (cheap, no network)
+        jobs = []
         for idx, validation in enumerate(validation_results, 1):
             try:
                 video_name = validation.get('video_name', '')
@@ -373,8 +390,6 @@ class EvidenceVideoProcessor:
                     logger.debug(f"[{idx}/{total_validations}] No frame results for {video_name}, skipping")
                     continue
 
-                logger.info(f"[{idx}/{total_validations}] Processing evidence for: {video_name}")
-
                 # Create output directory for this video
                 video_output_dir = output_dir / video_name.replace('.mp4', '')
                 video_output_dir.mkdir(parents=True, exist_ok=True)
@@ -422,33 +437,150 @@ class EvidenceVideoProcessor:
                         })
 
                 if not frames_to_process:
-                    logger.info(f"  All evidence images exist for {video_name}, skipping")
+                    logger.info(f"[{idx}/{total_validations}] All evidence images exist for {video_name}, skipping")
                     continue
 
-                logger.info(f"  Need to create {len(frames_to_process)} evidence images")
-
-                # Download evidence video
-                logger.info(f"  Downloading evidence video from: {url_video_evidence}")
-                response = api_file_browser.get_raw_video_evidence_by_filepath(url_video_evidence)
-                video_bytes = response.content
-                logger.info(f"  Downloaded {len(video_bytes)} bytes")
-
-                # Process video and create images
-                created_count = self._process_evidence_video(
-                    video_bytes,
-                    frames_to_process,
-                    draw_kwargs
-                )
-
-                logger.info(f"  Created {created_count} new evidence images for {video_name}")
+                jobs.append({
+                    'idx': idx,
+                    'video_name': video_name,
+                    'url': url_video_evidence,
+                    'frames_to_process': frames_to_process,
+                })
 
             except Exception as e:
                 logger.error(f"  Failed to process evidence for validation {idx}: {e}")
                 import traceback
                 logger.error(traceback.format_exc())
 
+        if not jobs:
+            return validation_results
+
+        # 2. Download evidence videos in a pool while frames of finished downloads are decoded
+        logger.info(f"Downloading {len(jobs)} evidence videos ({cf.EVIDENCE_DOWNLOAD_WORKERS} workers)")
+        with tempfile.TemporaryDirectory(prefix='qc_evidence_', ignore_cleanup_errors=True) as tmp_root:
+            for job, video_path, job_dir, error in self._prefetch_evidence_videos(jobs, api_file_browser, tmp_root):
+                idx, video_name = job['idx'], job['video_name']
+                try:
+                    if error is not None:
+                        raise error
+                    if video_path is None:
+                        raise FileNotFoundError(f"Failed to download evidence video: {job['url']}")
+
+                    logger.info(f"[{idx}/{total_validations}] Processing evidence for: {video_name} "
+                                f"({len(job['frames_to_process'])} images)")
+                    created_count = self._process_evidence_video(
+                        video_path,
+                        job['frames_to_process'],
+                        draw_kwargs
+                    )
+                    logger.info(f"  Created {created_count} new evidence images for {video_name}")
+
+                except Exception as e:
+                    logger.error(f"  Failed to process evidence for validation {idx}: {e}")
+                    import traceback
+                    logger.error(traceback.format_exc())
+                finally:
+                    if video_path:
+                        api_file_browser.release_evidence_video(video_path)
+                    if job_dir:
+                        shutil.rmtree(job_dir, ignore_errors=True)
+
         return validation_results
 
+    @staticmethod
+    def _prefetch_evidence_videos(
+        jobs: List[Dict],
+        api_file_browser,
+        tmp_root: str,
+        workers: int = cf.EVIDENCE_DOWNLOAD_WORKERS,
+        prefetch: int = cf.EVIDENCE_PREFETCH,
+        timeout: float = cf.EVIDENCE_DOWNLOAD_TIMEOUT
+    ) -> Iterator[Tuple[Dict, Optional[str], Optional[str], Optional[Exception]]]:
+        """
+        Download evidence videos in a thread pool, yielding them in job order
+        At most `prefetch` downloads are in flight or waiting to be decoded, which bounds temp disk use.
+        Cached videos are handed out pinned (see EvidenceVideoCache.release), so downloads committing in
+        other workers cannot evict a file before it is decoded; the consumer releases it afterwards.
+        Args:
+            jobs: List of {idx, video_name, url, frames_to_process}
+            api_file_browser: FileBrowserAPIClient instance (thread-safe)
+            tmp_root: Directory for per-video temp dirs
+            workers: Concurrent downloads
+            prefetch: Videos downloaded ahead of the one being decoded
+            timeout: Max seconds for one download, counted from when a worker starts it (not from when
+                the consumer gets to it). A download over the deadline is cancelled: it stops at its
+                next chunk, commits nothing to the cache and frees its worker.
+        Yields:
+            (job, video_path, job_dir, error), job_dir is the temp dir to delete after decoding
+        """
+        total = len(jobs)
+        progress = {'done': 0, 'bytes': 0}
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def download(job: Dict, state: Dict) -> Tuple[Optional[str], str]:
+            state['started_at'] = time.monotonic()
+            state['started'].set()
+            job_dir = tempfile.mkdtemp(dir=tmp_root)
+            frame_ids = [f['frame_id'] for f in job['frames_to_process']]
+            video_path = api_file_browser.get_evidence_video_path(job['url'], job_dir, frame_ids=frame_ids,
+                                                                  pin=True, cancel=state['cancel'])
+            size = Path(video_path).stat().st_size if video_path else 0
+            with lock:
+                progress['done'] += 1
+                progress['bytes'] += size
+                done, total_bytes = progress['done'], progress['bytes']
+            elapsed = time.perf_counter() - started
+            logger.info(f"  Evidence downloads {done}/{total}: {job['video_name']} ({size / 1024 / 1024:.1f} MB), "
+                        f"{total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0:.1f} MB/s overall")
+            return video_path, job_dir
+
+        def submit(job: Dict):
+            state = {'started': threading.Event(), 'cancel': threading.Event(), 'started_at': None}
+            in_flight.append((job, state, executor.submit(download, job, state)))
+
+        def discard_late(future):
+            # A cancelled download that still finished (e.g. a cache hit) must not keep its pin or temp dir
+            if future.cancelled() or future.exception() is not None:
+                return
+            video_path, job_dir = future.result()
+            if video_path:
+                api_file_browser.release_evidence_video(video_path)
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        pending = iter(jobs)
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='evidence_download')
+        try:
+            for job in itertools.islice(pending, max(prefetch, workers, 1)):
+                submit(job)
+
+            while in_flight:
+                job, state, future = in_flight.popleft()
+                video_path, job_dir, error = None, None, None
+                # Queued behind other downloads: the deadline only starts once a worker picks it up
+                while not state['started'].wait(timeout=1) and not future.done():
+                    pass
+                try:
+                    remaining = state['started_at'] + timeout - time.monotonic()
+                    video_path, job_dir = future.result(timeout=max(0.0, remaining))
+                except FuturesTimeoutError:
+                    state['cancel'].set()
+                    future.add_done_callback(discard_late)
+                    error = TimeoutError(f"Evidence download exceeded {timeout}s: {job['url']}")
+                except Exception as e:
+                    error = e
+
+                next_job = next(pending, None)
+                if next_job is not None:
+                    submit(next_job)
+                yield job, video_path, job_dir, error
+        finally:
+            for _, state, future in in_flight:
+                state['cancel'].set()
+                future.add_done_callback(discard_late)
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def process_actual_results_reject_video(
         self,
         validation: Dict,
@@ -527,16 +659,19 @@ class EvidenceVideoProcessor:
 
             # Download evidence video
             logger.info(f"  Downloading evidence video from: {url_video_evidence}")
-            response = api_file_browser.get_raw_video_evidence_by_filepath(url_video_evidence)
-            video_bytes = response.content
-            logger.info(f"  Downloaded {len(video_bytes)} bytes")
-
-            # Process video and create images
-            created_count = self._process_evidence_video(
-                video_bytes,
-                frames_to_process,
-                draw_kwargs
-            )
+            with tempfile.TemporaryDirectory(prefix='qc_evidence_') as tmp_dir:
+                video_path = api_file_browser.get_evidence_video_path(
+                    url_video_evidence, tmp_dir, frame_ids=[f['frame_id'] for f in frames_to_process])
+                if video_path is None:
+                    raise FileNotFoundError(f"Failed to download evidence video: {url_video_evidence}")
+                logger.info(f"  Downloaded {Path(video_path).stat().st_size} bytes")
+
+                # Process video and create images
+                created_count = self._process_evidence_video(
+                    video_path,
+                    frames_to_process,
+                    draw_kwargs
+                )
 
             logger.info(f"  Created {created_count} new evidence images for {video_name}")
 
@@ -620,14 +755,14 @@ class EvidenceVideoProcessor:
 
     def _process_evidence_video(
         self,
-        video_bytes: bytes,
+        video_path: str,
         frames_to_process: List[Dict],
         draw_kwargs: Dict
     ) -> int:
         """
         Process evidence video and create images
         Args:
-            video_bytes: Video content
+            video_path: Local evidence video file
             frames_to_process: List of {frame_id, image_path, bounding_boxes, actual_ref}
             draw_kwargs: Drawing parameters
         Returns:
@@ -635,7 +770,7 @@ class EvidenceVideoProcessor:
         """
         created_count = 0
 
-        with VideoProcessor(video_bytes) as vp:
+        with VideoProcessor(video_path=video_path) as vp:
             # Get video info
             info = vp.get_video_info()
             logger.debug(f"  Video info: {info}")
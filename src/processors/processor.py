@@ -1,7 +1,8 @@
 """Test Processor - Main workflow for AI model testing"""
 import logging
+import tempfile
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Dict, Tuple
 
 from config.settings import cf
@@ -12,10 +13,14 @@ from src.connectors.ai_api import FileBrowserAPIClient
 from src.processors.validator import ResultValidator, ExpectedResultBuilder
 from src.processors.evidence_video import EvidenceVideoProcessor
 from src.utils.test_orchestrator import TestOrchestrator
+from src.utils.upload_scheduler import UploadScheduler
+from src.utils.upload_registry import UploadRegistry, FingerprintCache
+from src.utils.evidence_cache import EvidenceVideoCache
+from src.utils.rule_config_registry import RuleConfigRegistry, json_fingerprint
 
 from src.utils.helpers import (
     ResultWriter, VideoConfigBuilder, BatchCodeGenerator,
-    CameraMapper, ConfigParser, build_result_data, gen_timestamp, format_duration, merge_video_url_into_expected
+    CameraMapper, ConfigParseError, RuleConfigIndex, build_result_data, gen_timestamp, format_duration, merge_video_url_into_expected
 )
 
 logger = logging.getLogger(__name__)
@@ -44,23 +49,35 @@ class ProcessedRule:
     missing_count: int
     video_names: List[str]
     start_time: datetime
+    upload_batches: List[Dict] = field(default_factory=list)
 
 
 class TestProcessor:
     """Process workflow test"""
 
-    def __init__(self, api_url: str = cf.API_LOCAL, iou_threshold=0.5, debug=False, batch_debug: str=''):
-        self.gs = GoogleSheetConnector()
-        self.smb = SMBConnector(cf.SMB_SERVER, cf.SMB_USER, cf.SMB_PASSWORD, cf.SMB_ROOT)
+    def __init__(self, api_url: str = cf.API_LOCAL, iou_threshold=0.5, debug=False, batch_debug: str='',
+                 video_storage=None, file_browser_url: str = cf.API_FILE_BROWSER, sheet_connector=None):
+        """
+        video_storage: SMBConnector-like video source (default: SMB share), e.g. LocalVideoStorage offline
+        file_browser_url: Server evidence videos are downloaded from
+        sheet_connector: GoogleSheetConnector to use, e.g. one loaded from a snapshot
+        """
+        self.gs = sheet_connector or GoogleSheetConnector()
+        self.smb = video_storage or SMBConnector(cf.SMB_SERVER, cf.SMB_USER, cf.SMB_PASSWORD, cf.SMB_ROOT)
         self.api = AIAPIClient(base_url=api_url, debug=debug)
-        self.api_file_browser = FileBrowserAPIClient(cf.API_FILE_BROWSER)
+        self.evidence_cache = EvidenceVideoCache() if cf.EVIDENCE_CACHE_ENABLED else None
+        self.api_file_browser = FileBrowserAPIClient(file_browser_url, cache=self.evidence_cache)
         self.camera_mapper = CameraMapper()
+        self.config_indexes: Dict[str, RuleConfigIndex] = {}
         self.result_writer = ResultWriter()
         self.timestamp = gen_timestamp()
         self.debug = debug
         self.batch_debug = batch_debug
         self.iou_threshold = iou_threshold
         self.total_video = 0
+        self.upload_registry = UploadRegistry() if cf.UPLOAD_REGISTRY_ENABLED else None
+        self.fingerprint_cache = FingerprintCache() if cf.UPLOAD_REGISTRY_ENABLED else None
+        self.rule_config_registry = RuleConfigRegistry() if cf.RULE_CONFIG_REGISTRY_ENABLED else None
 
     def get_enabled_rules(self) -> List[TestRule]:
         """Get list rules for test"""
@@ -83,13 +100,34 @@ class TestProcessor:
         logger.info(f"Found {len(rules)} enabled rules")
         return rules
 
+    def get_config_index(self, config_sheet: str) -> RuleConfigIndex:
+        """Config sheet compiled once per run"""
+        if config_sheet not in self.config_indexes:
+            index = RuleConfigIndex(self.gs.get_filled_blank_merged_cell(config_sheet))
+            self.config_indexes[config_sheet] = index
+            self.camera_mapper.update(index.camera_codes)
+        return self.config_indexes[config_sheet]
+
     def get_rule_config(self, rule: TestRule) -> Tuple[Dict, Dict]:
-        """Get rule config from Google Sheet"""
-        all_configs = self.gs.get_filled_blank_merged_cell(rule.tenant_config_sheet)
-        return ConfigParser.parse(all_configs, rule.rule_code)
+        """Get rule config from Google Sheet, reusing the last parse while the rule's rows are unchanged"""
+        index = self.get_config_index(rule.tenant_config_sheet)
+        if self.rule_config_registry is None:
+            return index.get(rule.rule_code)
+
+        source = json_fingerprint(index.rule_rows(rule.rule_code))
+        parsed = self.rule_config_registry.get_parsed(rule.rule_code, source)
+        if parsed is not None:
+            logger.info(f"Config rows unchanged for {rule.rule_code}, reuse parsed config")
+            return parsed
+
+        config, camera_mapping = index.get(rule.rule_code)
+        if config:
+            self.rule_config_registry.store_parsed(rule.rule_code, source, config, camera_mapping)
+            self.rule_config_registry.save()
+        return config, camera_mapping
 
     def update_rule_config(self, rule: TestRule):
-        """Update rule config via API"""
+        """Update rule config via API (skipped when the agent already has this exact config)"""
         config, camera_mapping = self.get_rule_config(rule)
         self.camera_mapper.update(camera_mapping)
 
@@ -97,44 +135,172 @@ class TestProcessor:
             logger.warning(f"Skip config update for {rule.rule_code}")
             return
 
+        # The agent replaces the whole rule config on update, so skipping is all-or-nothing per rule
+        if self.rule_config_registry is not None and self.rule_config_registry.is_pushed(
+                self.api.base_url, rule.rule_code, config):
+            logger.info(f"Rule config unchanged, skip update: {rule.rule_code} {list(config.keys())}")
+            return {"rule_code": rule.rule_code, "config": config}
+
         logger.info(f"Updating rule: {rule.rule_code} {list(config.keys())}")
         data_update_config = self.api.update_rule(rule.rule_code, config)
+
+        if self.rule_config_registry is not None and not self.api.debug:
+            self.rule_config_registry.mark_pushed(self.api.base_url, rule.rule_code, config)
+            self.rule_config_registry.save()
         return data_update_config
 
+    def add_config_error_result(self, rule: TestRule, errors: List[ConfigParseError]):
+        """Record a rule that was not run because its config sheet has invalid Json cells"""
+        batch_code = BatchCodeGenerator.generate(rule.tenant_name, rule.rule_name, self.timestamp)
+        result_data = build_result_data(
+            batch_code=batch_code,
+            timestamp=self.timestamp,
+            rule=rule,
+            videos_metadata=[],
+            missing_count=0,
+            videos_config={},
+            rule_config={},
+            config_errors=errors
+        )
+        self.result_writer.add_result(batch_code, rule.rule_code, result_data)
+
     def get_videos_metadata(self, rule: TestRule) -> List[Dict]:
         """Get videos metadata from sheet"""
         videos_data = self.gs.get_videos_with_camera(rule.sheet_name)
         logger.info(f"Sheet '{rule.sheet_name}': {len(videos_data)} videos")
         return self.camera_mapper.add_codes_to_metadata(videos_data)
 
-    def download_videos(self, rule: TestRule, video_names: List[str]) -> List[Tuple[str, bytes]]:
-        """Download specific videos from SMB"""
+    def download_videos(self, rule: TestRule, video_names: List[str], target_dir: str,
+                        fingerprints: Dict[str, str] = None) -> List[Tuple[str, str]]:
+        """
+        Download specific videos from SMB into target_dir, returns [(name, local_path), ...]
+        Videos with identical fingerprints are downloaded once and share the local file.
+        """
         smb_dir = f"{rule.tenant_dir}/{rule.rule_name}"
-        videos = self.smb.get_video_by_list(smb_dir, video_names)
-        success = [(name, data) for name, data in videos if data is not None]
-
-        failed = len(videos) - len(success)
+        fingerprints = fingerprints or {}
+
+        unique_names = []
+        duplicates = {}  # name -> name of first video with same content
+        first_by_fingerprint = {}
+        for name in video_names:
+            fingerprint = fingerprints.get(name)
+            if fingerprint and fingerprint in first_by_fingerprint:
+                duplicates[name] = first_by_fingerprint[fingerprint]
+                continue
+            if fingerprint:
+                first_by_fingerprint[fingerprint] = name
+            unique_names.append(name)
+        if duplicates:
+            logger.info(f"Skip download of {len(duplicates)} videos with identical content")
+
+        videos = self.smb.get_video_files_by_list(smb_dir, unique_names, target_dir)
+        paths = {name: path for name, path in videos if path is not None}
+        success = [(name, paths[duplicates.get(name, name)]) for name in video_names
+                   if duplicates.get(name, name) in paths]
+
+        failed = len(video_names) - len(success)
         if failed > 0:
-            logger.warning(f"Failed to download {failed}/{len(videos)} videos")
+            logger.warning(f"Failed to download {failed}/{len(video_names)} videos")
 
         return success
 
+    def upload_missing_videos(self, rule: TestRule, video_names: List[str], fingerprints: Dict[str, str],
+                              spool_dir: str) -> List[Dict]:
+        """
+        Download from SMB and upload in size-bounded batches (UploadScheduler.upload_spooled)
+        Batches are planned from the SMB listing sizes; videos with identical fingerprints stay in one
+        batch so they are downloaded once and share the spooled file.
+        """
+        smb_dir = f"{rule.tenant_dir}/{rule.rule_name}"
+        stats = self.smb.get_video_stats(smb_dir, video_names)
+        groups = {}  # fingerprint (or name) -> names, in first-seen order
+        for name in video_names:
+            groups.setdefault(fingerprints.get(name) or name, []).append(name)
+        sizes = [(names, sum(stats.get(name, (0, 0))[0] for name in names)) for names in groups.values()]
+        return UploadScheduler(self.api).upload_spooled(
+            sizes, lambda names, batch_dir: self.download_videos(rule, names, batch_dir, fingerprints), spool_dir)
+
+    def get_video_fingerprints(self, smb_dir: str, video_names: List[str]) -> Dict[str, str]:
+        """
+        Fingerprints of videos in smb_dir, reusing cached ones while size and mtime are unchanged
+        Costs one directory listing, plus sampled reads only for new or modified videos.
+        """
+        stats = self.smb.get_video_stats(smb_dir, video_names)
+        fingerprints = {}
+        to_fingerprint = []
+        for name in video_names:
+            if name not in stats:
+                continue
+            fingerprint = self.fingerprint_cache.get(f"{smb_dir}/{name}", *stats[name])
+            if fingerprint:
+                fingerprints[name] = fingerprint
+            else:
+                to_fingerprint.append(name)
+
+        if to_fingerprint:
+            logger.info(f"Fingerprinting {len(to_fingerprint)}/{len(video_names)} new or modified videos")
+            for name, fingerprint in self.smb.get_video_fingerprints(smb_dir, to_fingerprint).items():
+                if fingerprint:
+                    fingerprints[name] = fingerprint
+                    self.fingerprint_cache.put(f"{smb_dir}/{name}", *stats[name], fingerprint)
+            self.fingerprint_cache.save()
+        return fingerprints
+
+    def check_missing_videos(self, rule: TestRule, video_names: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Check videos missing on AI server, using the upload registry to skip known uploads
+        Returns:
+            (missing_names, fingerprints)
+        """
+        if self.upload_registry is None:
+            return self.api.check_missing_videos(video_names), {}
+
+        smb_dir = f"{rule.tenant_dir}/{rule.rule_name}"
+        server_url = self.api.base_url
+        fingerprints = self.get_video_fingerprints(smb_dir, video_names)
+        to_check = [name for name in video_names
+                    if not self.upload_registry.is_uploaded(server_url, name, fingerprints.get(name))]
+        logger.info(f"Upload registry: {len(video_names) - len(to_check)}/{len(video_names)} videos already uploaded")
+
+        missing = self.api.check_missing_videos(to_check) if to_check else []
+        missing_set = set(missing)
+        for name in to_check:
+            if name not in missing_set:
+                self.upload_registry.mark_uploaded(server_url, name, fingerprints.get(name))
+        self.upload_registry.save()
+        return missing, fingerprints
+
     def get_expected_results(self, rule: TestRule, video_names: List[str]) -> Dict[str, Dict]:
         """Get expected results from Google Sheet"""
-        sheet_rows = self.gs.get_info_rows_by_video_names(rule.sheet_name, video_names)
+        test_cases = self.gs.get_test_cases_by_video_names(rule.sheet_name, video_names)
 
         expected_builder = ExpectedResultBuilder(fps=24, compression_ratio=2.5)
         expected_results = {}
 
-        for row in sheet_rows:
-            video_name = row.get('Video Name', '')
-            if video_name:
-                expected = expected_builder.build_from_sheet_row(row, rule.rule_code)
-                expected_results[video_name] = expected
+        for test_case in test_cases:
+            if test_case.video_name:
+                expected = expected_builder.build_from_test_case(test_case, rule.rule_code)
+                expected_results[test_case.video_name] = expected
 
         logger.info(f"Built expected results for {len(expected_results)} test cases")
         return expected_results
 
+    def write_back_results(self, rule: TestRule, validation_results: List[Dict]):
+        """Write PASSED/FAILED, note and run date of every test case to the rule sheet (one batch)"""
+        run_date = datetime.strptime(self.timestamp, "%Y%m%d_%H%M%S").strftime('%Y-%m-%d %H:%M:%S')
+        results = {
+            validation['video_name']: {
+                'result': validation.get('detect_result', 'UNKNOWN'),
+                'note': validation.get('validation_note', ''),
+                'date': run_date,
+            }
+            for validation in validation_results
+        }
+        try:
+            self.gs.update_results(rule.sheet_name, results)
+        except Exception as e:
+            logger.error(f"Failed to write results to sheet '{rule.sheet_name}': {e}")
+
     def upload_and_trigger_analysis(self, rule: TestRule) -> ProcessedRule:
         """Phase 1: Upload videos and trigger AI analysis"""
         start_time = datetime.now()
@@ -160,16 +326,27 @@ class TestProcessor:
         # 3. Check missing videos
         all_names = [v['video_name'] for v in videos_metadata]
         self.total_video += len(all_names)
-        missing = self.api.check_missing_videos(all_names)
+        missing, fingerprints = self.check_missing_videos(rule, all_names)
         logger.info(f"Missing: {len(missing)}/{len(all_names)} videos")
 
         # 4. Download and upload missing
+        upload_batches = []
         if missing:
-            logger.info(f"Downloading {len(missing)} videos...")
-            missing_videos = self.download_videos(rule, missing)
-            if missing_videos:
-                logger.info(f"Uploading {len(missing_videos)} videos...")
-                self.api.upload_videos(missing_videos)
+            # Spooled batch by batch: temp disk holds a few batches, never every missing video
+            with tempfile.TemporaryDirectory(prefix='qc_upload_') as spool_dir:
+                logger.info(f"Downloading and uploading {len(missing)} videos...")
+                upload_batches = self.upload_missing_videos(rule, missing, fingerprints, spool_dir)
+            if self.upload_registry is not None and upload_batches:
+                for batch in upload_batches:
+                    if batch['status'] != 'success':
+                        continue
+                    for name in batch['video_names']:
+                        self.upload_registry.mark_uploaded(self.api.base_url, name, fingerprints.get(name))
+                self.upload_registry.save()
+            failed_batches = [b for b in upload_batches if b['status'] != 'success']
+            if failed_batches:
+                raise RuntimeError(f"Upload failed for {len(failed_batches)}/{len(upload_batches)} "
+                                   f"batches: {failed_batches[0]['error']}")
         else:
             logger.info("All videos already uploaded")
 
@@ -191,7 +368,8 @@ class TestProcessor:
             # camera_rule_config=camera_rule_config,
             missing_count=len(missing),
             video_names=all_names,
-            start_time=start_time
+            start_time=start_time,
+            upload_batches=upload_batches
         )
 
     def validate_results(self, processed: ProcessedRule) -> Dict:
@@ -212,58 +390,42 @@ class TestProcessor:
         smb_dir = f"{rule.tenant_dir}/{rule.rule_name}"
         evidence_processor.process_expected_results(expected_results, smb_dir)
 
-        # 2. Get AI results from evidences API
+        # 2-4. Get AI results from evidences API and validate each video
         logger.info(f"Fetching evidences for batch: {batch_code}")
-        evidences = self.api.get_all_evidences(batch_code, rule.rule_code)
-        logger.info(f"Got {len(evidences)} evidences")
-
-        # 3. Group evidences by video_code
-        evidences_by_video = {}
-        evidences_by_video_with_url = {}
-        for evidence in evidences:
-            video_code = evidence.get('video_code', '')
-            frames = evidence.get('payload', {}).get('frames', [])
-            url_video_evidence = evidence.get('payload', {}).get('videoMetadata', {}).get('filename', '')
-            if video_code:
-                evidences_by_video[video_code] = frames
-                evidences_by_video_with_url[video_code] = url_video_evidence
-
-        merge_video_url_into_expected(expected_results, evidences_by_video_with_url)
-
-        # 4. Validate each video
         validator = ResultValidator(iou_threshold=self.iou_threshold)
-        validation_results = []
+        if cf.EVIDENCE_STREAMING:
+            validation_results = self.validate_streaming(validator, expected_results, batch_code, rule.rule_code)
+        else:
+            validation_results = self.validate_collected(validator, expected_results, batch_code, rule.rule_code)
+
         passed_count = 0
         failed_count = 0
-
-        for video_name, expected in expected_results.items():
-            video_code = video_name.replace('.mp4', '')
-            actual_results = evidences_by_video.get(video_code, {})
-
-            validation = validator.validate_video(expected, actual_results)
-            validation_results.append(validation)
-
-            detect_result = validation.get('detect_result', 'UNKNOWN')
+        for validation in validation_results:
+            video_name = validation['video_name']
             note = validation.get('validation_note', '')
-
-            if detect_result == 'PASSED':
+            if validation.get('detect_result', 'UNKNOWN') == 'PASSED':
                 passed_count += 1
                 logger.info(f"  ✓ {video_name} (TC{validation['test_case_id']}): PASSED - {note}")
             else:
                 failed_count += 1
                 logger.info(f"  ✗ {video_name} (TC{validation['test_case_id']}): FAILED - {note}")
 
-                # 5. Process actual/evidence results and create evidence images
-                logger.info(f"\n{'=' * 60}")
-                logger.info(f"Processing evidence images...")
-                logger.info(f"{'=' * 60}")
-
-            if validation.get('expected_status', '') == 'Approve':
-                evidence_processor.process_actual_results(
-                    validation_results,
-                    self.api_file_browser,
-                    output_base_dir=f'{cf.DIR_EVIDENCE_IMAGE}/{rule.rule_name}'
-                )
+        if cf.SHEET_WRITE_BACK:
+            self.write_back_results(rule, validation_results)
+
+        # 5. Process actual/evidence results and create evidence images
+        # Every validation up to the last Approve one, in one pass (images that already exist are skipped)
+        last_approve = max((i for i, v in enumerate(validation_results)
+                            if v.get('expected_status', '') == 'Approve'), default=None)
+        if last_approve is not None:
+            logger.info(f"\n{'=' * 60}")
+            logger.info(f"Processing evidence images...")
+            logger.info(f"{'=' * 60}")
+            evidence_processor.process_actual_results(
+                validation_results[:last_approve + 1],
+                self.api_file_browser,
+                output_base_dir=f'{cf.DIR_EVIDENCE_IMAGE}/{rule.rule_name}'
+            )
         for validation in validation_results:
             if validation.get('expected_status', '') == 'Reject' and validation.get('url_video_evidence', ''):
                 evidence_processor.process_actual_results_reject_video(
@@ -272,6 +434,9 @@ class TestProcessor:
                     output_base_dir=f'{cf.DIR_EVIDENCE_IMAGE}/{rule.rule_name}'
                 )
 
+        if self.evidence_cache is not None:
+            logger.info(f"Evidence cache: {self.evidence_cache.stats()}")
+
         # Calculate timing
         end_time = datetime.now()
         duration_seconds = (end_time - start_time).total_seconds()
@@ -295,6 +460,7 @@ class TestProcessor:
             rule=rule,
             videos_metadata=processed.videos_metadata,
             missing_count=processed.missing_count,
+            upload_batches=processed.upload_batches,
             videos_config=processed.videos_config,
             rule_config=processed.rule_config,
             validation_results=validation_results,
@@ -319,6 +485,82 @@ class TestProcessor:
             "duration": format_duration(duration_seconds)
         }
 
+    def validate_collected(self, validator: ResultValidator, expected_results: Dict[str, Dict],
+                           batch_code: str, rule_code: str) -> List[Dict]:
+        """Fetch every evidence first, then group by video_code and validate"""
+        evidences = self.api.get_all_evidences(batch_code, rule_code)
+        logger.info(f"Got {len(evidences)} evidences")
+
+        # Group evidences by video_code
+        evidences_by_video = {}
+        evidences_by_video_with_url = {}
+        for evidence in evidences:
+            video_code = evidence.get('video_code', '')
+            frames = evidence.get('payload', {}).get('frames', [])
+            url_video_evidence = evidence.get('payload', {}).get('videoMetadata', {}).get('filename', '')
+            if video_code:
+                evidences_by_video[video_code] = frames
+                evidences_by_video_with_url[video_code] = url_video_evidence
+
+        merge_video_url_into_expected(expected_results, evidences_by_video_with_url)
+
+        validation_results = []
+        for video_name, expected in expected_results.items():
+            video_code = video_name.replace('.mp4', '')
+            actual_results = evidences_by_video.get(video_code, {})
+            validation_results.append(validator.validate_video(expected, actual_results))
+        return validation_results
+
+    def validate_streaming(self, validator: ResultValidator, expected_results: Dict[str, Dict],
+                           batch_code: str, rule_code: str) -> List[Dict]:
+        """
+        Validate videos while evidence pages arrive, with the same results as validate_collected
+        Only the last evidence of a video counts (as in validate_collected). The agent lists a video's
+        evidences together, so a video is validated as soon as the stream moves past its video_code and
+        only the evidence being read is held; validation overlaps the page downloads (prefetched
+        concurrently). A video_code that shows up again later is validated again with the later evidence,
+        so the result does not depend on that ordering. Videos without evidence are validated at the end.
+        """
+        expected_by_code = {name.replace('.mp4', ''): name for name in expected_results}
+        results = {}
+        current_name, current_evidence = None, None
+        received = revalidated = 0
+
+        sheet_urls = {}  # url_video_evidence before the stream, restored when a later evidence has none
+
+        def validate(video_name: str, evidence: Dict):
+            payload = evidence.get('payload', {})
+            expected = expected_results[video_name]
+            sheet_urls.setdefault(video_name, expected.get('url_video_evidence'))
+            url_video_evidence = payload.get('videoMetadata', {}).get('filename', '') or sheet_urls[video_name]
+            if url_video_evidence:
+                expected['url_video_evidence'] = url_video_evidence
+            else:
+                expected.pop('url_video_evidence', None)
+            results[video_name] = validator.validate_video(expected, payload.get('frames', []))
+
+        for evidence in self.api.iter_evidences(batch_code, rule_code):
+            received += 1
+            video_name = expected_by_code.get(evidence.get('video_code', ''))
+            if not video_name:
+                continue
+            if video_name != current_name:
+                if current_name is not None:
+                    validate(current_name, current_evidence)
+                revalidated += video_name in results
+                current_name = video_name
+            current_evidence = evidence
+        if current_name is not None:
+            validate(current_name, current_evidence)
+
+        logger.info(f"Got {received} evidences for {len(results)}/{len(expected_results)} videos")
+        if revalidated:
+            logger.info(f"{revalidated} videos had evidences spread over the stream and were validated again")
+
+        # Keep expected_results order in the report
+        return [results[video_name] if video_name in results else validator.validate_video(expected, {})
+                for video_name, expected in expected_results.items()]
+
     def run(self):
         """Run test all rules - 2 phases (REFACTORED)"""
         # Check SMB connection
@@ -332,6 +574,9 @@ class TestProcessor:
             logger.warning("No enabled rules found")
             return
 
+        # One batch-get for every sheet the run will read
+        self.gs.preload([r.tenant_config_sheet for r in rules], test_case_sheets=[r.sheet_name for r in rules])
+
         # Initialize orchestrator
         orchestrator = TestOrchestrator(self)
 
@@ -3,6 +3,7 @@ import logging
 from typing import List, Dict, Tuple
 
 from src.utils.helpers import get_first_frame_id_reject_video
+from src.utils.test_case import ExpectedEvent, TestCase, parse_expected_events
 
 logger = logging.getLogger(__name__)
 
@@ -84,16 +85,19 @@ class ExpectedResultBuilder:
         """
         if not expected_result:
             return []
+        return self.build_frames_from_events(parse_expected_events(expected_result), event_start_time, rule_code)
 
+    def build_frames_from_events(
+        self,
+        events: List[ExpectedEvent],
+        event_start_time: str,
+        rule_code: str
+    ) -> List[Dict]:
+        """Same as build_expected_frames, from already parsed events"""
         frames = []
 
-        for index, detection in enumerate(expected_result):
-            event_start = detection.get('eventStart', '')
-            event_end = detection.get('eventEnd', '')
-            area = detection.get('area', [])
-
-            if not event_start or not event_end or not area:
-                continue
+        for event in events:
+            index, event_start, event_end, area = event.index, event.event_start, event.event_end, event.area
 
             # Calculate relative frame offsets for start, middle, end
             start_offset = self.calculate_relative_frame_offset(event_start, event_start_time)
@@ -141,41 +145,45 @@ class ExpectedResultBuilder:
             row: Sheet row with keys: TC, Video Name, Expected Status, ExpectedResult, etc.
             rule_code: Rule code being tested
 
+        Returns:
+            Same as build_from_test_case
+        """
+        return self.build_from_test_case(TestCase.from_row(row), rule_code)
+
+    def build_from_test_case(self, test_case: TestCase, rule_code: str) -> Dict:
+        """
+        Build expected result for one test case
+
+        Args:
+            test_case: TestCase loaded from the rule sheet
+            rule_code: Rule code being tested
+
         Returns:
             {
                 "video_name": str,
                 "test_case_id": str,
                 "expected_status": str,
                 "expected_frames": List[Dict],  # with RELATIVE frameIds
-                "should_validate": bool
+                "should_validate": bool,
+                "parse_error": str  # invalid ExpectedResult cell, '' when it parsed
             }
         """
-        video_name = row.get('Video Name', '')
-        test_case_id = row.get('TC', '')
-        test_case_description = row.get('Test Case Description', '')
-        expected_status = row.get('Expected Status', '').strip()
-        expected_result = row.get('ExpectedResult', [])
-        event_start_time = row.get('EventStartTime', '')
-        event_end_time = row.get('EventEndTime', '')
-
         # Always build expected frames for structure
-        expected_frames = []
-        if expected_result and isinstance(expected_result, list):
-            expected_frames = self.build_expected_frames(
-                expected_result,
-                event_start_time,
-                event_end_time,
-                rule_code
-            )
+        expected_frames = self.build_frames_from_events(
+            test_case.expected_events,
+            test_case.event_start_time,
+            rule_code
+        )
 
         return {
-            "video_name": video_name,
-            "test_case_id": test_case_id,
-            "test_case_description": test_case_description,
-            "expected_status": expected_status,
+            "video_name": test_case.video_name,
+            "test_case_id": test_case.test_case_id,
+            "test_case_description": test_case.description,
+            "expected_status": test_case.expected_status,
             "expected_frames": expected_frames,  # RELATIVE frameIds
             "should_validate": True,
-            "event_start_time": event_start_time,
+            "event_start_time": test_case.event_start_time,
+            "parse_error": test_case.parse_error,
         }
 
 
@@ -372,6 +380,22 @@ class ResultValidator:
         expected_status = expected_data['expected_status']
         expected_frames = expected_data['expected_frames']
 
+        # Malformed ExpectedResult cell: nothing to validate against, say so instead of a silent FAILED
+        if expected_data.get('parse_error'):
+            return {
+                "video_name": video_name,
+                "test_case_id": expected_data['test_case_id'],
+                "test_case_description": expected_data.get('test_case_description', ''),
+                "expected_status": expected_status,
+                "total_frames": 0,
+                "matched_frames": 0,
+                "accuracy": None,
+                "detect_result": "FAILED",
+                "validation_note": f"{expected_data['parse_error']} (fix the sheet cell, video not validated)",
+                "url_video_evidence": expected_data.get('url_video_evidence', ''),
+                "frame_results": []
+            }
+
         # Case 1: Expected Status = "Reject"
         if expected_status.lower() == 'reject':
             has_detection = len(actual_results) > 0
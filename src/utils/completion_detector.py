@@ -0,0 +1,196 @@
+"""Completion Detector - Poll evidence counts to know when the AI agent finished a batch"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchProgress:
+    """Polling state of one batch"""
+    batch_code: str
+    rule_code: str
+    video_codes: Set[str]
+    approve_videos: Set[str] = field(default_factory=set)  # videos expected to give evidence
+    seconds_per_video: float = float(cf.TIME_SLEEP)
+    first_seen: Dict[str, float] = field(default_factory=dict)  # video_code -> seconds when its evidence appeared
+    evidence_count: int = 0
+    read_count: int = 0  # evidences already read from the list
+    stable_polls: int = 0
+    last_change: float = 0.0  # time.monotonic() of the last count change
+    done: bool = False
+    reason: str = ""
+    completed_after: Optional[float] = None  # seconds since the wait started, when detected done
+
+    @property
+    def expected_videos(self) -> int:
+        return len(self.video_codes)
+
+    @property
+    def reported_videos(self) -> Set[str]:
+        return set(self.first_seen)
+
+    @property
+    def stable_window(self) -> float:
+        """Seconds without new evidence before giving up on videos that have not reported"""
+        return self.seconds_per_video * (self.expected_videos - len(self.first_seen))
+
+
+class CompletionDetector:
+    """
+    Poll evidence totals of each batch with adaptive backoff.
+    A batch is done when every Approve video in its videos_config has reported (distinct video_code
+    among its evidences); Reject videos and missed detections give no evidence, so they are not waited
+    for. Otherwise it is done once its count stopped changing for `stable_rounds` polls and for as long
+    as the agent would need for the videos that have not reported (predicted seconds per video x pending
+    videos); the deadline is the hard fallback. When the total grows only the new evidences are read,
+    which also gives the time each video first reported.
+    """
+
+    def __init__(self, api, min_interval: float = cf.POLL_INTERVAL_MIN, max_interval: float = cf.POLL_INTERVAL_MAX,
+                 stable_rounds: int = cf.POLL_STABLE_ROUNDS, backoff_factor: float = 1.5):
+        """
+        Args:
+            api: AIAPIClient instance
+            min_interval: Poll interval (seconds) right after a count changed
+            max_interval: Max poll interval while counts are unchanged
+            stable_rounds: Unchanged polls needed (at least) to consider a batch done
+            backoff_factor: Interval growth while nothing changes
+        """
+        self.api = api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_rounds = stable_rounds
+        self.backoff_factor = backoff_factor
+
+    @staticmethod
+    def build_progress(processed_rules: List, seconds_per_video: Dict[str, float] = None) -> List[BatchProgress]:
+        """seconds_per_video: {batch_code: predicted seconds}, TIME_SLEEP for batches not in it"""
+        seconds_per_video = seconds_per_video or {}
+        batches = []
+        for p in processed_rules:
+            video_codes = {code for videos in p.videos_config.values() for code in videos}
+            approve_videos = {
+                v['video_name'].replace('.mp4', '') for v in p.videos_metadata
+                if v.get('expected_status', '').strip().lower() == 'approve'
+            } & video_codes
+            batches.append(BatchProgress(
+                batch_code=p.batch_code,
+                rule_code=p.rule.rule_code,
+                video_codes=video_codes,
+                approve_videos=approve_videos,
+                seconds_per_video=seconds_per_video.get(p.batch_code, float(cf.TIME_SLEEP)),
+            ))
+        return batches
+
+    def _read_new_evidences(self, progress: BatchProgress, elapsed: float):
+        """Read evidences past read_count, record when each video first reported"""
+        for evidence in self.api.iter_evidences_after(progress.batch_code, progress.rule_code, progress.read_count):
+            progress.read_count += 1
+            video_code = evidence.get('video_code', '')
+            if video_code in progress.video_codes and video_code not in progress.first_seen:
+                progress.first_seen[video_code] = elapsed
+
+    def _poll(self, progress: BatchProgress, start: float) -> bool:
+        """Update one batch, returns True if its evidence count changed"""
+        try:
+            result = self.api.get_evidences(progress.batch_code, progress.rule_code, page=1, page_size=1)
+        except Exception as e:
+            logger.warning(f"Poll failed for {progress.batch_code}: {e}")
+            return False
+
+        now = time.monotonic()
+        count = result.get("total", 0)
+        changed = count != progress.evidence_count
+        if count < progress.read_count:
+            # List shrank (evidences removed on the agent): positions moved, read it again
+            progress.read_count = 0
+        if count > progress.read_count:
+            try:
+                self._read_new_evidences(progress, round(now - start, 1))
+            except Exception as e:
+                logger.warning(f"Poll failed for {progress.batch_code}: {e}")
+                return False
+        progress.evidence_count = count
+        if changed:
+            progress.stable_polls, progress.last_change = 0, now
+        else:
+            progress.stable_polls += 1
+
+        reported = progress.reported_videos
+        if reported >= progress.video_codes:
+            progress.done, progress.reason = True, "all videos reported"
+        elif progress.approve_videos and reported >= progress.approve_videos:
+            progress.done, progress.reason = True, "all approve videos reported"
+        elif (count > 0 and progress.stable_polls >= self.stable_rounds
+              and now - progress.last_change >= progress.stable_window):
+            progress.done, progress.reason = True, (
+                f"no new evidence for {now - progress.last_change:.0f}s "
+                f"({progress.expected_videos - len(reported)} videos not reported)")
+        return changed
+
+    def wait(self, processed_rules: List, deadline_seconds: float, initial_wait: float = 0.0,
+             seconds_per_video: Dict[str, float] = None) -> Dict[str, Dict]:
+        """
+        Block until every batch is done or the deadline passes
+        Args:
+            seconds_per_video: {batch_code: predicted seconds per video} (WaitPlan.batch_seconds_per_video)
+        Returns:
+            {batch_code: {evidences, reported_videos, expected_videos, approve_videos, done, reason,
+                          completed_after_seconds, video_first_seen}}
+        """
+        batches = self.build_progress(processed_rules, seconds_per_video)
+        start = time.monotonic()
+        for progress in batches:
+            progress.last_change = start
+        deadline = start + deadline_seconds
+        interval = self.min_interval
+
+        if initial_wait > 0:
+            time.sleep(min(initial_wait, deadline_seconds))
+
+        while True:
+            changed = False
+            for progress in batches:
+                if not progress.done:
+                    changed |= self._poll(progress, start)
+                    if progress.done:
+                        progress.completed_after = round(time.monotonic() - start, 1)
+
+            pending = [b for b in batches if not b.done]
+            elapsed = time.monotonic() - start
+            logger.info(f"AI progress ({elapsed:.0f}s): " + ", ".join(
+                f"{b.batch_code} {len(b.reported_videos)}/{b.expected_videos} videos "
+                f"({len(b.reported_videos & b.approve_videos)}/{len(b.approve_videos)} approve)"
+                f"{' done' if b.done else ''}" for b in batches))
+
+            if not pending:
+                logger.info(f"All batches completed after {elapsed:.0f}s")
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for b in pending:
+                    b.reason = "deadline reached"
+                logger.warning(f"Deadline reached with {len(pending)} batches still pending")
+                break
+
+            interval = self.min_interval if changed else min(interval * self.backoff_factor, self.max_interval)
+            time.sleep(min(interval, remaining))
+
+        return {
+            b.batch_code: {
+                "evidences": b.evidence_count,
+                "reported_videos": len(b.reported_videos),
+                "expected_videos": b.expected_videos,
+                "approve_videos": len(b.approve_videos),
+                "done": b.done,
+                "reason": b.reason,
+                "completed_after_seconds": b.completed_after,
+                "video_first_seen": b.first_seen,
+            }
+            for b in batches
+        }
@@ -0,0 +1,150 @@
+"""Evidence Cache - Disk-backed LRU cache for evidence videos downloaded from the file browser"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+
+class EvidenceVideoCache:
+    """
+    Files are named by sha1 of the evidence file path. Recency is the file mtime (touched on hit),
+    so LRU order survives between runs. Downloads go to a temp file in the cache dir and are renamed
+    into place, so a crashed download never leaves a half-written entry.
+    Paths handed out with pin=True are never evicted until release(): prefetched jobs decode them
+    while other downloads keep committing (and evicting) in worker threads.
+    """
+
+    def __init__(self, cache_dir: str = cf.EVIDENCE_CACHE_DIR, max_bytes: int = cf.EVIDENCE_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # filename -> size, oldest first
+        self._pins: Dict[str, int] = {}  # filename -> number of holders
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        # Leftovers of interrupted writes
+        for tmp_path in self.cache_dir.glob('*.tmp'):
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+        files = []
+        for path in self.cache_dir.glob('*.mp4'):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, path.name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+        logger.debug(f"Evidence cache: {len(self._entries)} files, {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    @staticmethod
+    def _filename(key: str) -> str:
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.mp4'
+
+    def get_path(self, key: str, pin: bool = False) -> Optional[Path]:
+        """Cached file path for key (marks it recently used), None on miss. pin: keep it until release()"""
+        name = self._filename(key)
+        path = self.cache_dir / name
+        with self._lock:
+            if name in self._entries and path.exists():
+                self._entries.move_to_end(name)
+                self.hits += 1
+                os.utime(path)
+                if pin:
+                    self._pin(name)
+                return path
+            if name in self._entries:
+                self.total_bytes -= self._entries.pop(name)
+            self.misses += 1
+            return None
+
+    def new_temp_path(self) -> Path:
+        """Temp file in the cache dir to download into, then pass to commit()"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        return Path(tmp_path)
+
+    def commit(self, key: str, tmp_path: Path, pin: bool = False) -> Path:
+        """
+        Atomically move a finished download into the cache, evicting LRU files above the size budget.
+        pin: keep the returned path until release()
+        """
+        name = self._filename(key)
+        path = self.cache_dir / name
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+        with self._lock:
+            if name in self._entries:
+                self.total_bytes -= self._entries.pop(name)
+            self._entries[name] = size
+            self.total_bytes += size
+            if pin:
+                self._pin(name)
+            self._evict()
+        return path
+
+    def _pin(self, name: str):
+        self._pins[name] = self._pins.get(name, 0) + 1
+
+    def release(self, path) -> None:
+        """Drop a pin taken by get_path/commit; no-op for paths outside the cache or not pinned"""
+        path = Path(path)
+        if path.parent != self.cache_dir:
+            return
+        with self._lock:
+            count = self._pins.get(path.name, 0)
+            if count > 1:
+                self._pins[path.name] = count - 1
+            elif count == 1:
+                del self._pins[path.name]
+                self._evict()
+
+    def _evict(self):
+        # Oldest first, skipping pinned files; the newest entry always stays
+        for name in list(self._entries)[:-1]:
+            if self.total_bytes <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            size = self._entries.pop(name)
+            try:
+                (self.cache_dir / name).unlink()
+            except OSError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+                "evictions": self.evictions,
+                "files": len(self._entries),
+                "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            }
+
+
+if __name__ == '__main__':
+    cache = EvidenceVideoCache()
+    print(cache.stats())
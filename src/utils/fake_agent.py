@@ -0,0 +1,253 @@
+"""Fake AI Agent - Local stand-in for the AI agent API, for offline end-to-end runs and benchmarks
+
+Run:
+    python -m src.utils.fake_agent --expected data_test/expected_rows.json --port 8888
+then point TestProcessor at it: TestProcessor(api_url=cf.API_LOCAL)
+For a full run without network (local videos, sheet snapshot, this agent in-process) use
+python -m src.utils.offline_run instead.
+
+The expected file holds sheet rows as returned by GoogleSheetConnector.get_info_rows_by_video_names
+(a list of rows, or {video_name: row}). Evidences are synthesized from them so the validator passes
+for every Approve video and Reject videos get no evidence.
+
+With a video_dir, uploaded videos are kept there and the agent also plays the file browser
+(/api/login, /api/raw/...): each evidence points at its uploaded video, so evidence images are drawn.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, File, HTTPException, UploadFile, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from config.settings import cf
+from src.processors.validator import ExpectedResultBuilder
+
+logger = logging.getLogger(__name__)
+
+# Synthesized detections start at this absolute frame id
+BASE_FRAME_ID = 100
+
+
+class RuleUpdate(BaseModel):
+    rule_code: str
+    config: Dict
+
+
+class CheckVideos(BaseModel):
+    videos: List[str]
+
+
+class AnalyzeRequest(BaseModel):
+    batch_code: str
+    videos_config: Dict[str, List[str]]
+
+
+def load_expected_rows(path: str) -> Dict[str, Dict]:
+    """Load expected sheet rows keyed by video code (video name without .mp4)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rows = data.values() if isinstance(data, dict) else data
+    return {row.get('Video Name', '').replace('.mp4', ''): row for row in rows if row.get('Video Name')}
+
+
+def synthesize_frames(row: Dict, rule_code: str) -> List[Dict]:
+    """
+    Build AI frames that the validator accepts for this row:
+    each detection event starts at its own frame and every expected frame is placed at start + offset_frame
+    """
+    builder = ExpectedResultBuilder(fps=24, compression_ratio=2.5)
+    expected_result = row.get('ExpectedResult', [])
+    if isinstance(expected_result, str):
+        try:
+            expected_result = json.loads(expected_result)
+        except json.JSONDecodeError:
+            expected_result = []
+    if not isinstance(expected_result, list):
+        return []
+
+    expected_frames = builder.build_expected_frames(
+        expected_result, row.get('EventStartTime', ''), row.get('EventEndTime', ''), rule_code)
+
+    group_start = {}
+    frames = {}
+    for frame in expected_frames:
+        expect_id = frame['expect_id']
+        if expect_id not in group_start:
+            group_start[expect_id] = BASE_FRAME_ID + frame['frameId']
+        frame_id = group_start[expect_id] + frame['offset_frame']
+        areas = frames.setdefault(frame_id, [])
+        for area in frame['detectedAreas']:
+            areas.append({**area, 'confidence': 0.9})
+
+    return [{'frameId': frame_id, 'detectedAreas': areas} for frame_id, areas in sorted(frames.items())]
+
+
+class FakeAgentState:
+    """In-memory state of the fake agent"""
+
+    def __init__(self, expected_rows: Dict[str, Dict], processing_delay: float, video_dir: Optional[str] = None):
+        self.expected_rows = expected_rows
+        self.processing_delay = processing_delay
+        self.video_dir = video_dir
+        self.rules: Dict[str, Dict] = {}
+        self.videos: Dict[str, int] = {}  # filename -> size
+        # batch_code -> [(ready_at, video_code, camera_code)]
+        self.batches: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, batch_code: str, videos_config: Dict[str, List[str]]):
+        """Queue videos: each one becomes ready processing_delay seconds after the previous"""
+        now = time.monotonic()
+        with self._lock:
+            queued = sum(1 for jobs in self.batches.values() for ready_at, _, _ in jobs if ready_at > now)
+            jobs = []
+            for camera_code, video_codes in videos_config.items():
+                for video_code in video_codes:
+                    queued += 1
+                    jobs.append((now + queued * self.processing_delay, video_code, camera_code))
+            self.batches[batch_code] = jobs
+
+    def video_path(self, filename: str) -> Optional[str]:
+        """Local path of an uploaded video, None when uploads are not kept"""
+        if not self.video_dir:
+            return None
+        return os.path.join(self.video_dir, os.path.basename(filename))
+
+    def evidence_filename(self, video_code: str) -> str:
+        """File browser path of the evidence video (the uploaded video itself), '' if not kept"""
+        path = self.video_path(f"{video_code}.mp4")
+        return f"/evidence/{video_code}.mp4" if path and os.path.exists(path) else ''
+
+    def evidences(self, batch_code: Optional[str], rule_code: Optional[str]) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            batches = {batch_code: self.batches.get(batch_code, [])} if batch_code else dict(self.batches)
+
+        evidences = []
+        for code, jobs in batches.items():
+            for ready_at, video_code, camera_code in jobs:
+                row = self.expected_rows.get(video_code)
+                if ready_at > now or not row:
+                    continue
+                if row.get('Expected Status', '').strip().lower() == 'reject':
+                    continue
+                evidences.append({
+                    'batch_code': code,
+                    'rule_code': rule_code or '',
+                    'video_code': video_code,
+                    'camera_code': camera_code,
+                    'payload': {
+                        'frames': synthesize_frames(row, rule_code or ''),
+                        'videoMetadata': {'filename': self.evidence_filename(video_code)},
+                    },
+                })
+        return evidences
+
+
+def create_app(expected_rows: Dict[str, Dict], latency: float = 0.0, processing_delay: float = 1.0,
+               video_dir: Optional[str] = None) -> FastAPI:
+    """
+    Args:
+        expected_rows: {video_code: sheet_row}
+        latency: Extra seconds added to every response
+        processing_delay: Seconds the fake model spends per video
+        video_dir: Keep uploaded videos here and serve them as evidence videos
+    """
+    app = FastAPI(title="Fake AI Agent")
+    state = FakeAgentState(expected_rows, processing_delay, video_dir)
+    app.state.agent = state
+
+    @app.middleware("http")
+    async def add_latency(request, call_next):
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.post(cf.URL_UPDATE_RULE_CODE)
+    async def update_rule(body: RuleUpdate):
+        state.rules[body.rule_code] = body.config
+        return {"rule_code": body.rule_code, "cameras": list(body.config.keys())}
+
+    @app.get(cf.URL_GET_RULE_CODE + "{rule_code}")
+    async def get_rule(rule_code: str):
+        return {"rule_code": rule_code, "config": state.rules.get(rule_code, {})}
+
+    @app.post(cf.URL_POST_VIDEO)
+    async def upload_videos(videos: List[UploadFile] = File(...)):
+        uploaded = []
+        for video in videos:
+            size = 0
+            path = state.video_path(video.filename)
+            out = open(path, 'wb') if path else None
+            try:
+                while chunk := await video.read(1024 * 1024):
+                    size += len(chunk)
+                    if out:
+                        out.write(chunk)
+            finally:
+                if out:
+                    out.close()
+            state.videos[video.filename] = size
+            uploaded.append({"filename": video.filename, "size": size})
+        return {"uploaded": uploaded}
+
+    @app.post(cf.URL_CHECK_MISSING_VIDEO)
+    async def check_videos(body: CheckVideos):
+        return {"missing_videos": [name for name in body.videos if name not in state.videos]}
+
+    @app.post(cf.URL_ANALYZE_VIDEO)
+    async def analyze_videos(body: AnalyzeRequest):
+        state.analyze(body.batch_code, body.videos_config)
+        return {"batch_code": body.batch_code, "status": "processing"}
+
+    @app.get(cf.URL_GET_EVIDENCES)
+    async def get_evidences(page: int = Query(1, ge=1), page_size: int = Query(20, ge=1),
+                            batch_code: Optional[str] = None, rule_code: Optional[str] = None):
+        evidences = state.evidences(batch_code, rule_code)
+        start = (page - 1) * page_size
+        return {
+            "data": evidences[start:start + page_size],
+            "total": len(evidences),
+            "page": page,
+            "page_size": page_size,
+        }
+
+    @app.post('/api/login', response_class=PlainTextResponse)
+    async def login():
+        return "fake-agent-token"
+
+    @app.get('/api/raw/{file_path:path}')
+    async def raw_video(file_path: str):
+        path = state.video_path(file_path)
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"{file_path} not found")
+        return FileResponse(path, media_type='video/mp4')
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake AI agent")
+    parser.add_argument('--expected', required=True, help="JSON file with expected sheet rows")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--processing-delay', type=float, default=1.0, help="Seconds of fake processing per video")
+    parser.add_argument('--video-dir', default=None, help="Keep uploads here and serve them as evidence videos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rows = load_expected_rows(args.expected)
+    logger.info(f"Fake agent serving {len(rows)} expected videos on {args.host}:{args.port}")
+    if args.video_dir:
+        os.makedirs(args.video_dir, exist_ok=True)
+    uvicorn.run(create_app(rows, args.latency, args.processing_delay, args.video_dir), host=args.host, port=args.port)
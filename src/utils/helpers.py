@@ -1,6 +1,7 @@
 """Processor Utils - Helper functions for TestProcessor"""
 import json
 import logging
+from dataclasses import dataclass, asdict
 from typing import Dict, List, Tuple
 from pathlib import Path
 from datetime import datetime
@@ -71,6 +72,14 @@ class ResultWriter:
         # Add to details
         self.all_results['details'][batch_code] = data
 
+    def add_api_metrics(self, metrics: Dict[str, Dict]):
+        """Add per-endpoint API latency/throughput summary"""
+        self.all_results['api_metrics'] = metrics
+
+    def add_ai_completion(self, completion: Dict[str, Dict]):
+        """Add per-batch AI completion detected while waiting (see CompletionDetector.wait)"""
+        self.all_results['ai_completion'] = completion
+
     def save_all(self, session_name: str = None):
         """Save all results to single JSON file"""
         if not session_name:
@@ -147,9 +156,9 @@ class CameraMapper:
         """
         Add camera_code to videos metadata
         Args:
-            videos_data: [{'video_name': '...', 'camera_name': '...'}, ...]
+            videos_data: [{'video_name': '...', 'camera_name': '...', 'expected_status': '...'}, ...]
         Returns:
-            [{'video_name': '...', 'camera_name': '...', 'camera_code': '...'}, ...]
+            [{'video_name': '...', 'camera_name': '...', 'expected_status': '...', 'camera_code': '...'}, ...]
         """
         result = []
         for v in videos_data:
@@ -160,45 +169,109 @@ class CameraMapper:
             result.append({
                 'video_name': v['video_name'],
                 'camera_name': v['camera_name'],
+                'expected_status': v.get('expected_status', ''),
                 'camera_code': camera_code
             })
         return result
 
 
-class ConfigParser:
-    """Parse rule config from Google Sheet data"""
+@dataclass
+class ConfigParseError:
+    """Json cell of the config sheet that could not be parsed"""
+    row: int  # sheet row number (header is row 1)
+    rule_code: str
+    camera_code: str
+    camera_name: str
+    message: str
 
-    @staticmethod
-    def parse(all_configs: List[Dict], rule_code: str) -> Tuple[Dict, Dict]:
+    def __str__(self):
+        return f"row {self.row}, rule {self.rule_code}, camera {self.camera_code} ({self.camera_name}): {self.message}"
+
+
+class RuleConfigError(ValueError):
+    """
+    Some Json cells of a rule could not be parsed. The agent replaces the whole rule config on
+    update, so the rule must not be pushed (or tested) with those cameras left out.
+    """
+
+    def __init__(self, rule_code: str, errors: List[ConfigParseError]):
+        self.rule_code = rule_code
+        self.errors = errors
+        super().__init__(f"Invalid config Json for {rule_code}: " + "; ".join(str(e) for e in errors))
+
+
+class RuleConfigIndex:
+    """
+    Config sheet compiled once: rows grouped by rule_code and a global camera name <-> code map.
+    Json cells of a rule are parsed on its first lookup and kept. A rule with a bad cell raises
+    RuleConfigError (every bad cell of the rule listed) on each lookup; other rules are unaffected.
+    """
+
+    def __init__(self, all_configs: List[Dict]):
+        """
+        Args:
+            all_configs: Config sheet rows (GoogleSheetConnector.get_filled_blank_merged_cell)
         """
-        Parse config for specific rule
+        self.rows: Dict[str, List[Tuple[int, Dict]]] = {}  # rule_code -> [(sheet_row, row)]
+        self.camera_codes: Dict[str, str] = {}  # camera_name -> camera_code
+        self.camera_names: Dict[str, str] = {}  # camera_code -> camera_name
+        self._parsed: Dict[str, Tuple[Dict, Dict]] = {}
+        self._errors: Dict[str, List[ConfigParseError]] = {}
+
+        for row_number, cfg in enumerate(all_configs, 2):
+            self.rows.setdefault(cfg.get('rule_code'), []).append((row_number, cfg))
+            camera_code, camera_name = cfg.get('camera_code'), cfg.get('camera_name')
+            if camera_name and camera_code:
+                self.camera_codes[camera_name] = camera_code
+                self.camera_names[camera_code] = camera_name
+
+    def rule_rows(self, rule_code: str) -> List[Dict]:
+        """Raw config rows of a rule"""
+        return [cfg for _, cfg in self.rows.get(rule_code, [])]
+
+    def get(self, rule_code: str) -> Tuple[Dict, Dict]:
+        """
+        Parsed config for specific rule
         Returns:
             (config_dict, camera_mapping)
+        Raises:
+            RuleConfigError: a Json cell of the rule is invalid
         """
-        rule_configs = [cfg for cfg in all_configs if cfg.get('rule_code') == rule_code]
+        if rule_code in self._errors:
+            raise RuleConfigError(rule_code, self._errors[rule_code])
+        if rule_code in self._parsed:
+            return self._parsed[rule_code]
 
+        rule_configs = self.rows.get(rule_code, [])
         if not rule_configs:
             logger.warning(f"No config found for rule {rule_code}")
             return {}, {}
 
         config = {}
         camera_mapping = {}
-
-        for cfg in rule_configs:
+        errors = []
+        for row_number, cfg in rule_configs:
             camera_code = cfg.get('camera_code')
             camera_name = cfg.get('camera_name')
-            json_str = cfg.get('Json', '{}')
+            json_str = cfg.get('Json') or '{}'
 
             # Build camera mapping
             if camera_name and camera_code:
                 camera_mapping[camera_name] = camera_code
 
             # Parse JSON config
-            json_str = json_str.replace("'", '"')
-            camera_config = json.loads(json_str)
-            config[camera_code] = camera_config
+            try:
+                config[camera_code] = json.loads(json_str.replace("'", '"'))
+            except json.JSONDecodeError as e:
+                name = camera_name or self.camera_names.get(camera_code, '')
+                errors.append(ConfigParseError(row_number, rule_code, camera_code, name, str(e)))
+
+        if errors:
+            self._errors[rule_code] = errors
+            raise RuleConfigError(rule_code, errors)
 
         logger.info(f"Loaded config for {len(config)} cameras")
+        self._parsed[rule_code] = (config, camera_mapping)
         return config, camera_mapping
 
 
@@ -213,11 +286,17 @@ def build_result_data(
         validation_results: List[Dict] = None,
         start_time: datetime = None,
         end_time: datetime = None,
-        duration_seconds: float = None
+        duration_seconds: float = None,
+        upload_batches: List[Dict] = None,
+        config_errors: List[ConfigParseError] = None
 ) -> Dict:
-    """Build result data structure with enhanced format and timing"""
+    """
+    Build result data structure with enhanced format and timing
+    config_errors: invalid config Json cells of the rule; the rule was not run and its status is "error"
+    """
     # Calculate statistics from validation results
-    total_testcases = len(validation_results) if validation_results else 0
+    validation_results = validation_results or []
+    total_testcases = len(validation_results)
     passed_count = sum(1 for v in validation_results if v.get('detect_result') == 'PASSED')
     failed_count = sum(1 for v in validation_results if v.get('detect_result') == 'FAILED')
 
@@ -239,6 +318,7 @@ def build_result_data(
         "rule_code": rule.rule_code,
         "total_testcases": total_testcases,
         "uploaded_videos": missing_count,
+        "upload_batches": upload_batches or [],
         "videos_config": videos_config,
         "rule_config": rule_config,
         "test_statistics": {
@@ -248,8 +328,9 @@ def build_result_data(
             "pass_rate": round((passed_count / total_testcases * 100), 2) if total_testcases > 0 else 0.0
         },
         "timing": timing_info,
-        "test_case_validation_result": validation_results or [],
-        "status": "success"
+        "test_case_validation_result": validation_results,
+        "config_errors": [asdict(e) for e in config_errors or []],
+        "status": "error" if config_errors else "success"
     }
 
 
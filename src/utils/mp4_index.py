@@ -0,0 +1,186 @@
+"""MP4 Index - Read the moov sample table to know which bytes hold given video frames"""
+import bisect
+import struct
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+class Mp4IndexError(ValueError):
+    """MP4 layout not supported for partial fetching (caller should download the full file)"""
+
+
+def iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (box_type, payload_start, box_end) for boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise Mp4IndexError(f"Invalid box size {size} for {box_type!r} at {pos}")
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+
+def find_child(data: bytes, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for child_type, child_start, child_end in iter_boxes(data, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+
+def locate_moov(read_range: Callable[[int, int], bytes], total_size: int) -> Tuple[int, int]:
+    """
+    Walk top-level box headers to find moov
+    Args:
+        read_range: read_range(start, end_inclusive) -> bytes
+        total_size: File size
+    Returns:
+        (moov_offset, moov_size) including the box header
+    """
+    pos = 0
+    while pos + 8 <= total_size:
+        header = read_range(pos, min(pos + 15, total_size - 1))
+        size, box_type = struct.unpack_from('>I4s', header, 0)
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+        elif size == 0:
+            size = total_size - pos
+        if box_type == b'moov':
+            return pos, size
+        if box_type == b'moof':
+            raise Mp4IndexError("Fragmented MP4 is not supported")
+        if size < 8:
+            raise Mp4IndexError(f"Invalid top-level box size {size} at {pos}")
+        pos += size
+    raise Mp4IndexError("moov box not found")
+
+
+@dataclass
+class Mp4SampleIndex:
+    """Byte offset/size of each video sample (frame) and the keyframe list, in decode order"""
+    offsets: List[int]
+    sizes: List[int]
+    sync_samples: Optional[List[int]]  # 0-based keyframe indexes, None means every sample is a keyframe
+
+    @classmethod
+    def from_moov(cls, moov: bytes) -> 'Mp4SampleIndex':
+        """Parse the first video track of a complete moov box"""
+        moov_payload = next(iter_boxes(moov), None)
+        if moov_payload is None or moov_payload[0] != b'moov':
+            raise Mp4IndexError("Data does not start with a moov box")
+
+        for box_type, start, end in iter_boxes(moov, moov_payload[1], moov_payload[2]):
+            if box_type != b'trak':
+                continue
+            mdia = find_child(moov, start, end, b'mdia')
+            if mdia is None:
+                continue
+            hdlr = find_child(moov, mdia[0], mdia[1], b'hdlr')
+            # hdlr: version/flags(4) + pre_defined(4) + handler_type(4)
+            if hdlr is None or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+                continue
+            minf = find_child(moov, mdia[0], mdia[1], b'minf')
+            stbl = find_child(moov, minf[0], minf[1], b'stbl') if minf else None
+            if stbl is None:
+                raise Mp4IndexError("Video track without stbl")
+            return cls._from_stbl(moov, *stbl)
+
+        raise Mp4IndexError("No video track found")
+
+    @classmethod
+    def _from_stbl(cls, data: bytes, start: int, end: int) -> 'Mp4SampleIndex':
+        boxes = {box_type: (s, e) for box_type, s, e in iter_boxes(data, start, end)}
+        if b'stsz' not in boxes or b'stsc' not in boxes or (b'stco' not in boxes and b'co64' not in boxes):
+            raise Mp4IndexError("Incomplete sample table")
+
+        # stsz: version/flags, sample_size, sample_count, [entry_size...]
+        pos = boxes[b'stsz'][0]
+        sample_size, sample_count = struct.unpack_from('>II', data, pos + 4)
+        if sample_size:
+            sizes = [sample_size] * sample_count
+        else:
+            sizes = list(struct.unpack_from(f'>{sample_count}I', data, pos + 12))
+
+        # stco/co64: version/flags, entry_count, [chunk_offset...]
+        if b'co64' in boxes:
+            pos = boxes[b'co64'][0]
+            count = struct.unpack_from('>I', data, pos + 4)[0]
+            chunk_offsets = list(struct.unpack_from(f'>{count}Q', data, pos + 8))
+        else:
+            pos = boxes[b'stco'][0]
+            count = struct.unpack_from('>I', data, pos + 4)[0]
+            chunk_offsets = list(struct.unpack_from(f'>{count}I', data, pos + 8))
+
+        # stsc: version/flags, entry_count, [(first_chunk, samples_per_chunk, description_index)...]
+        pos = boxes[b'stsc'][0]
+        count = struct.unpack_from('>I', data, pos + 4)[0]
+        stsc = [struct.unpack_from('>III', data, pos + 8 + i * 12)[:2] for i in range(count)]
+
+        offsets = []
+        sample = 0
+        for i, (first_chunk, samples_per_chunk) in enumerate(stsc):
+            last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+            for chunk in range(first_chunk, last_chunk + 1):
+                offset = chunk_offsets[chunk - 1]
+                for _ in range(samples_per_chunk):
+                    if sample >= sample_count:
+                        break
+                    offsets.append(offset)
+                    offset += sizes[sample]
+                    sample += 1
+        if len(offsets) != sample_count:
+            raise Mp4IndexError(f"Sample table mismatch: {len(offsets)} offsets for {sample_count} samples")
+
+        sync_samples = None
+        if b'stss' in boxes:
+            pos = boxes[b'stss'][0]
+            count = struct.unpack_from('>I', data, pos + 4)[0]
+            sync_samples = [s - 1 for s in struct.unpack_from(f'>{count}I', data, pos + 8)]
+
+        return cls(offsets=offsets, sizes=sizes, sync_samples=sync_samples)
+
+    @property
+    def sample_count(self) -> int:
+        return len(self.offsets)
+
+    def keyframe_before(self, frame_id: int) -> int:
+        if not self.sync_samples:
+            return frame_id
+        idx = bisect.bisect_right(self.sync_samples, frame_id) - 1
+        return self.sync_samples[idx] if idx >= 0 else 0
+
+    def byte_ranges(self, frame_ids: List[int], lead_frames: int = 16, trailing_frames: int = 2,
+                    merge_gap: int = 64 * 1024) -> List[Tuple[int, int]]:
+        """
+        Byte ranges [(start, end_exclusive)] holding every sample needed to decode frame_ids:
+        from the keyframe before (frame - lead_frames) up to frame + trailing_frames.
+        The lead covers decoders that seek a little before the target; the trail covers B-frame reordering.
+        Ranges closer than merge_gap are merged into one request.
+        """
+        if not self.offsets:
+            return []
+
+        last_sample = self.sample_count - 1
+        spans = []
+        for frame_id in sorted(set(frame_ids)):
+            frame_id = min(max(frame_id, 0), last_sample)
+            first = self.keyframe_before(max(frame_id - lead_frames, 0))
+            last = min(frame_id + trailing_frames, last_sample)
+            start = min(self.offsets[first:last + 1])
+            end = max(o + s for o, s in zip(self.offsets[first:last + 1], self.sizes[first:last + 1]))
+            spans.append((start, end))
+
+        spans.sort()
+        merged = [spans[0]]
+        for start, end in spans[1:]:
+            if start - merged[-1][1] <= merge_gap:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
@@ -0,0 +1,106 @@
+"""Offline Run - Run TestProcessor end to end without network: sheet snapshot, local videos, in-process fake agent
+
+Run:
+    python -m src.utils.sheet_snapshot export --output sheets.json.gz   (once, with network)
+    python -m src.utils.offline_run --snapshot sheets.json.gz --video-dir data_test/video
+
+Sheets come from the snapshot, videos from --video-dir (same layout as the SMB share:
+<video-dir>/<tenant_dir>/<rule_name>/<video>), and the AI agent and file browser are the fake agent,
+started in this process with evidences synthesized from the snapshot's expected results.
+"""
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import uvicorn
+
+from config.settings import cf
+from src.connectors.google_sheet import GoogleSheetConnector
+from src.connectors.local_storage import LocalVideoStorage
+from src.processors.processor import TestProcessor
+from src.utils.fake_agent import create_app
+
+logger = logging.getLogger(__name__)
+
+
+def build_expected_rows(gs: GoogleSheetConnector, rules: List) -> Dict[str, Dict]:
+    """{video_code: sheet_row} of every enabled rule sheet, for the fake agent to synthesize evidences from"""
+    rows = {}
+    for rule in rules:
+        video_names = [v['video_name'] for v in gs.get_videos_with_camera(rule.sheet_name)]
+        for row in gs.get_info_rows_by_video_names(rule.sheet_name, video_names):
+            video_name = row.get('Video Name', '')
+            if video_name:
+                rows[video_name.replace('.mp4', '')] = row
+    return rows
+
+
+def start_fake_agent(expected_rows: Dict[str, Dict], port: int, processing_delay: float,
+                     latency: float, video_dir: str, startup_timeout: float = 30) -> uvicorn.Server:
+    """Serve the fake agent on 127.0.0.1:port from a daemon thread, returns once it accepts requests"""
+    app = create_app(expected_rows, latency, processing_delay, video_dir)
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, name='fake_agent', daemon=True).start()
+
+    deadline = time.monotonic() + startup_timeout
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Fake agent did not start on port {port}")
+        time.sleep(0.05)
+    return server
+
+
+def run_offline(snapshot_file: str, video_dir: str = cf.LOCAL_VIDEO_DIR, port: int = cf.FAKE_AGENT_PORT,
+                processing_delay: float = 1.0, latency: float = 0.0, iou_threshold: float = 0.3):
+    """
+    Args:
+        snapshot_file: Sheet snapshot written by `python -m src.utils.sheet_snapshot export`
+        video_dir: Local copy of the SMB share
+        port: Port of the in-process fake agent
+        processing_delay: Seconds of fake processing per video
+        latency: Extra seconds added to every fake agent response
+        iou_threshold: Validator IoU threshold
+    """
+    agent_url = f"http://127.0.0.1:{port}"
+    processor = TestProcessor(
+        api_url=agent_url,
+        iou_threshold=iou_threshold,
+        video_storage=LocalVideoStorage(video_dir),
+        file_browser_url=agent_url,
+        sheet_connector=GoogleSheetConnector(snapshot_file=snapshot_file),
+    )
+    # The fake agent starts empty on every run: forget what earlier runs pushed/uploaded to it
+    if processor.upload_registry is not None:
+        processor.upload_registry.invalidate(agent_url)
+        processor.upload_registry.save()
+    if processor.rule_config_registry is not None:
+        processor.rule_config_registry.invalidate(agent_url)
+        processor.rule_config_registry.save()
+
+    expected_rows = build_expected_rows(processor.gs, processor.get_enabled_rules())
+    with tempfile.TemporaryDirectory(prefix='fake_agent_') as agent_video_dir:
+        server = start_fake_agent(expected_rows, port, processing_delay, latency, agent_video_dir)
+        logger.info(f"Offline run: fake agent on {agent_url} with {len(expected_rows)} expected videos, "
+                    f"videos from {video_dir}, sheets from {snapshot_file}")
+        try:
+            return processor.run()
+        finally:
+            server.should_exit = True
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run the test pipeline offline against the fake agent")
+    parser.add_argument('--snapshot', default=cf.SHEET_SNAPSHOT_FILE, required=not cf.SHEET_SNAPSHOT_FILE,
+                        help="Sheet snapshot file (default: SHEET_SNAPSHOT_FILE)")
+    parser.add_argument('--video-dir', default=cf.LOCAL_VIDEO_DIR, help="Local copy of the SMB share")
+    parser.add_argument('--port', type=int, default=cf.FAKE_AGENT_PORT)
+    parser.add_argument('--processing-delay', type=float, default=1.0, help="Seconds of fake processing per video")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every agent response")
+    parser.add_argument('--iou-threshold', type=float, default=0.3)
+    args = parser.parse_args()
+
+    run_offline(args.snapshot, args.video_dir, args.port, args.processing_delay, args.latency, args.iou_threshold)
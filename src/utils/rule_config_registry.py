@@ -0,0 +1,119 @@
+"""Rule Config Registry - Remember parsed rule configs and the configs last pushed to each AI agent"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+
+def json_fingerprint(value) -> str:
+    """sha1 of normalized JSON (sorted keys, no whitespace), stable across runs"""
+    normalized = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class RuleConfigRegistry:
+    """
+    Persistent JSON registry:
+        parsed: {rule_code: {source, config, camera_mapping}}
+            source is the fingerprint of the rule's config sheet rows, parse is skipped while it matches
+        pushed: {agent_url: {rule_code: {fingerprint, cameras: [camera_code...], pushed_at}}}
+            a rule is pushed again only when its config fingerprint differs from the last push
+    Skipping is per rule only: the agent's update_rule replaces the whole rule config, there is no
+    partial update, so a change to any camera re-pushes every camera of that rule.
+    """
+
+    def __init__(self, registry_file: str = cf.RULE_CONFIG_REGISTRY_FILE):
+        self.registry_file = Path(registry_file)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        data = {}
+        if self.registry_file.exists():
+            try:
+                with open(self.registry_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Rule config registry unreadable, starting empty: {e}")
+        data.setdefault('parsed', {})
+        data.setdefault('pushed', {})
+        return data
+
+    def save(self):
+        """Write registry atomically (temp file + rename)"""
+        with self._lock:
+            self.registry_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.registry_file.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.registry_file)
+
+    @staticmethod
+    def _agent_key(agent_url: str) -> str:
+        return agent_url.rstrip('/')
+
+    def get_parsed(self, rule_code: str, source: str) -> Optional[Tuple[Dict, Dict]]:
+        """(config, camera_mapping) parsed from the same sheet rows before, None if rows changed"""
+        with self._lock:
+            entry = self.data['parsed'].get(rule_code)
+        if not entry or entry.get('source') != source:
+            return None
+        return entry['config'], entry['camera_mapping']
+
+    def store_parsed(self, rule_code: str, source: str, config: Dict, camera_mapping: Dict):
+        with self._lock:
+            self.data['parsed'][rule_code] = {'source': source, 'config': config, 'camera_mapping': camera_mapping}
+
+    def is_pushed(self, agent_url: str, rule_code: str, config: Dict) -> bool:
+        """True if this exact rule config was the last one pushed to agent_url"""
+        with self._lock:
+            entry = self.data['pushed'].get(self._agent_key(agent_url), {}).get(rule_code)
+        return bool(entry) and entry.get('fingerprint') == json_fingerprint({'rule_code': rule_code, 'config': config})
+
+    def mark_pushed(self, agent_url: str, rule_code: str, config: Dict):
+        with self._lock:
+            self.data['pushed'].setdefault(self._agent_key(agent_url), {})[rule_code] = {
+                'fingerprint': json_fingerprint({'rule_code': rule_code, 'config': config}),
+                'cameras': sorted(config),
+                'pushed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+    def invalidate(self, agent_url: Optional[str] = None) -> int:
+        """Forget pushed configs for one agent (or all agents), returns number of removed entries"""
+        with self._lock:
+            if agent_url is None:
+                removed = sum(len(v) for v in self.data['pushed'].values())
+                self.data['pushed'] = {}
+            else:
+                removed = len(self.data['pushed'].pop(self._agent_key(agent_url), {}))
+        logger.info(f"Rule config registry: removed {removed} entries ({agent_url or 'all agents'})")
+        return removed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the local rule config registry")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    invalidate_parser = subparsers.add_parser('invalidate', help="Force re-push of rule configs (e.g. agent restarted)")
+    invalidate_parser.add_argument('--agent', default=None, help="AI agent URL, default: all agents")
+    subparsers.add_parser('show', help="Print pushed rule configs per agent")
+    args = parser.parse_args()
+
+    registry = RuleConfigRegistry()
+    if args.command == 'invalidate':
+        registry.invalidate(args.agent)
+        registry.save()
+    else:
+        for agent, rules in registry.data['pushed'].items():
+            print(agent)
+            for rule_code, entry in rules.items():
+                print(f"  {rule_code}: {len(entry['cameras'])} cameras, pushed at {entry['pushed_at']}")
@@ -0,0 +1,73 @@
+"""Sheet Snapshot - Export the Google Sheets a run reads to a local file for offline, reproducible runs
+
+Export:
+    python -m src.utils.sheet_snapshot export --output data_test/sheet_snapshot.json.gz
+Run from it:
+    SHEET_SNAPSHOT_FILE=data_test/sheet_snapshot.json.gz python main.py
+"""
+import argparse
+import gzip
+import json
+import logging
+from typing import List, Tuple
+
+from config.settings import cf
+from src.connectors.google_sheet import GoogleSheetConnector
+
+logger = logging.getLogger(__name__)
+
+
+def rule_sheet_names(include_disabled: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    Sheets read by a run, from rules.yaml (same selection as TestProcessor.get_enabled_rules)
+    Returns:
+        (config_sheets, rule_sheets)
+    """
+    config_sheets, rule_sheets = [], []
+    for tenant in cf.RULES_CONFIG['tenant']:
+        if not tenant['enabled'] and not include_disabled:
+            continue
+        rules = [rule for rule in tenant['rules'] if rule['enabled'] or include_disabled]
+        if not rules:
+            continue
+        config_sheets.append(tenant.get('config rule', 'Rule_Config_Details'))
+        rule_sheets.extend(rule['sheet'] for rule in rules)
+    return config_sheets, rule_sheets
+
+
+def export_snapshot(output: str, include_disabled: bool = False) -> str:
+    """Read the config and rule sheets from the live spreadsheet (one batch-get) and write them to output"""
+    config_sheets, rule_sheets = rule_sheet_names(include_disabled)
+    gs = GoogleSheetConnector()
+    if gs.offline:
+        raise RuntimeError("Unset SHEET_SNAPSHOT_FILE to export from the live spreadsheet")
+    gs.preload(config_sheets, test_case_sheets=rule_sheets)
+    # Make sure every sheet is present even if the batch-get fell back to per-sheet reads
+    for name in config_sheets:
+        gs.get_sheet_values(name)
+    for name in rule_sheets:
+        gs.get_test_case_values(name)
+    logger.info(f"Sheets API calls: {gs.api_calls}")
+    return gs.export_snapshot(output)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export/inspect offline Google Sheet snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="Export the sheets needed by the enabled rules")
+    export_parser.add_argument('--output', default=f"{cf.DIR_RESULTS}/sheet_snapshot.json.gz")
+    export_parser.add_argument('--all', action='store_true', help="Include disabled tenants and rules")
+    show_parser = subparsers.add_parser('show', help="Print sheets and row counts of a snapshot file")
+    show_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_snapshot(args.output, args.all)
+    else:
+        with gzip.open(args.path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        print(f"Spreadsheet: {snapshot.get('sheet_id')}")
+        for sheet in snapshot.get('sheets', []):
+            columns = '{}:{}'.format(*sheet['columns']) if sheet['columns'] else 'all columns'
+            print(f"  {sheet['name']} ({columns}): {max(len(sheet['values']) - 1, 0)} rows")
@@ -58,6 +58,12 @@ class SimpReportGenerator:
                <b>Passed:</b> {stats['passed']} | 
                <b>Failed:</b> {stats['failed']} | 
                <b>Pass rate:</b> {stats['pass_rate']}%</p>
+            """
+            for e in info.get("config_errors", []):
+                html_sections += f"""
+            <p style="color:red"><b>Invalid config Json, rule not run:</b> row {e['row']},
+               camera {e['camera_code']} ({e['camera_name']}): {e['message']}</p>"""
+            html_sections += """
             <table>
                 <tr>
                     <th>Video</th>
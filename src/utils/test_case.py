@@ -0,0 +1,125 @@
+"""Test Case - Typed, slotted representation of rule sheet rows, parsed once at load"""
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TestCaseSheetError(ValueError):
+    """Rule sheet layout does not match what the test case loader expects"""
+
+
+@dataclass(slots=True)
+class ExpectedEvent:
+    """One expected detection: time span in the video and the violation area [x1, y1, x2, y2]"""
+    index: int  # position in the ExpectedResult list (used as expect_id)
+    event_start: str
+    event_end: str
+    area: Tuple[int, int, int, int]
+
+    @classmethod
+    def from_dict(cls, index: int, detection: Dict) -> Optional['ExpectedEvent']:
+        """None when the detection misses its start, end or area (skipped, as before)"""
+        if not isinstance(detection, dict):
+            return None
+        event_start = detection.get('eventStart', '')
+        event_end = detection.get('eventEnd', '')
+        area = detection.get('area', [])
+        if not event_start or not event_end or not area:
+            return None
+        if not isinstance(area, list) or len(area) != 4:
+            raise ValueError(f"area must be [x1, y1, x2, y2], got {area}")
+        return cls(index, event_start, event_end, tuple(cls._coordinate(value, area) for value in area))
+
+    @staticmethod
+    def _coordinate(value, area) -> int:
+        """Integer pixel coordinate (10.0 is accepted as 10), ValueError otherwise"""
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+            raise ValueError(f"area values must be integers, got {area}")
+        return int(value)
+
+
+def parse_expected_events(expected_result) -> List[ExpectedEvent]:
+    """ExpectedResult cell (JSON string or already-decoded list) -> events"""
+    if isinstance(expected_result, str):
+        expected_result = json.loads(expected_result) if expected_result.strip() else []
+    if not isinstance(expected_result, list):
+        return []
+    events = []
+    for index, detection in enumerate(expected_result):
+        event = ExpectedEvent.from_dict(index, detection)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+@dataclass(slots=True)
+class TestCase:
+    """One row of a rule sheet"""
+    test_case_id: str
+    description: str
+    video_name: str
+    camera_name: str
+    start_time: str
+    end_time: str
+    event_start_time: str
+    event_end_time: str
+    expected_status: str
+    expected_events: List[ExpectedEvent]
+    # Set when the ExpectedResult cell could not be parsed; the test case is then reported FAILED with it
+    parse_error: str = ''
+
+    # Sheet header of each field read from a header-keyed row dict
+    HEADERS = {
+        'test_case_id': 'TC',
+        'description': 'Test Case Description',
+        'video_name': 'Video Name',
+        'camera_name': 'Camera Name',
+        'start_time': 'StartTime',
+        'end_time': 'EndTime',
+        'event_start_time': 'EventStartTime',
+        'event_end_time': 'EventEndTime',
+        'expected_status': 'Expected Status',
+        'expected_result': 'ExpectedResult',
+    }
+
+    @classmethod
+    def from_values(cls, values: Dict[str, str], expected_result) -> 'TestCase':
+        """
+        Args:
+            values: {field_name: cell} for the text fields of HEADERS
+            expected_result: ExpectedResult cell (JSON string or decoded list)
+        """
+        parse_error = ''
+        try:
+            events = parse_expected_events(expected_result)
+        except (ValueError, TypeError) as e:
+            events = []
+            parse_error = f"Invalid ExpectedResult: {e}"
+            logger.error(f"TC {values.get('test_case_id', '')} ({values.get('video_name', '')}): {parse_error}")
+
+        def text(field: str) -> str:
+            value = values.get(field)
+            return value.strip() if isinstance(value, str) else ('' if value is None else str(value))
+
+        return cls(
+            test_case_id=text('test_case_id'),
+            description=text('description'),
+            video_name=text('video_name'),
+            camera_name=text('camera_name'),
+            start_time=text('start_time'),
+            end_time=text('end_time'),
+            event_start_time=text('event_start_time'),
+            event_end_time=text('event_end_time'),
+            expected_status=text('expected_status'),
+            expected_events=events,
+            parse_error=parse_error,
+        )
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'TestCase':
+        """From a header-keyed row dict (GoogleSheetConnector.get_info_rows_by_video_names, fake agent files)"""
+        values = {field: row.get(header) for field, header in cls.HEADERS.items() if field != 'expected_result'}
+        return cls.from_values(values, row.get(cls.HEADERS['expected_result'], []))
@@ -5,6 +5,12 @@ import uuid
 from typing import List, Dict
 from datetime import datetime
 
+from config.settings import cf
+from src.connectors.http_transport import request_metrics
+from src.utils.completion_detector import CompletionDetector
+from src.utils.helpers import RuleConfigError
+from src.utils.wait_predictor import WaitTimePredictor
+
 logger = logging.getLogger(__name__)
 
 
@@ -13,6 +19,7 @@ class TestOrchestrator:
 
     def __init__(self, processor):
         self.processor = processor
+        self.completion = {}
 
     def execute_phase1_upload(self, rules: List) -> tuple:
         """
@@ -33,6 +40,15 @@ class TestOrchestrator:
                 processed = self.processor.upload_and_trigger_analysis(rule)
                 processed_rules.append(processed)
                 logger.info(f"✓ Triggered: {rule.tenant_name} - {rule.rule_name}")
+            except RuleConfigError as e:
+                # Not pushed, uploaded or analyzed: a partial config would give results that look valid
+                logger.error(f"✗ Skipped {rule.rule_name}: {e}")
+                self.processor.add_config_error_result(rule, e.errors)
+                failed_rules.append({
+                    "rule": f"{rule.tenant_name} - {rule.rule_name}",
+                    "status": "error",
+                    "message": str(e)
+                })
             except Exception as e:
                 logger.error(f"✗ Failed to process {rule.rule_name}: {e}")
                 failed_rules.append({
@@ -55,14 +71,29 @@ class TestOrchestrator:
             videos_config={"linfox_DCBN-192_168_10_8": ["USEPHONE_VIP_1"]},
         )
 
-        # Calculate and wait
-        from config.settings import cf
+        # Fixed wait (used when polling is disabled)
         wait_time = cf.TIME_SLEEP * self.processor.total_video
+        if not cf.WAIT_FOR_COMPLETION:
+            logger.info(f"{'=' * 80}")
+            logger.info(
+                f"Waiting {wait_time} ({cf.TIME_SLEEP} * {self.processor.total_video}) seconds for AI to process videos...")
+            logger.info(f"{'=' * 80}")
+            time.sleep(wait_time)
+            return
+
+        predictor = WaitTimePredictor(self.processor.result_writer.results_dir)
+        predictor.load_history()
+        plan = predictor.predict(processed_rules)
+
         logger.info(f"{'=' * 80}")
-        logger.info(
-            f"Waiting {wait_time} ({cf.TIME_SLEEP} * {self.processor.total_video}) seconds for AI to process videos...")
+        logger.info(f"Polling AI progress for {len(processed_rules)} batches: predicted {plan.predicted_seconds}s "
+                    f"({plan.source}), first poll after {plan.initial_wait}s, deadline {plan.deadline}s")
         logger.info(f"{'=' * 80}")
-        time.sleep(wait_time)
+        detector = CompletionDetector(self.processor.api, min_interval=plan.poll_interval)
+        self.completion = detector.wait(processed_rules, deadline_seconds=plan.deadline,
+                                        initial_wait=plan.initial_wait,
+                                        seconds_per_video=plan.batch_seconds_per_video)
+        self.processor.result_writer.add_ai_completion(self.completion)
 
     def execute_phase2_validation(self, processed_rules: List, debug: bool, batch_debug) -> List[Dict]:
         """
@@ -121,6 +152,16 @@ class TestOrchestrator:
             else:
                 logger.info(f"✗ {rule_name}: FAILED - {r.get('message', 'Unknown error')}")
 
+        metrics = request_metrics.summary()
+        if metrics:
+            logger.info(f"{'=' * 80}")
+            logger.info("API METRICS")
+            logger.info(f"{'=' * 80}")
+            for endpoint, m in metrics.items():
+                logger.info(f"{endpoint}: {m['calls']} calls ({m['errors']} errors), "
+                            f"p50 {m['p50_ms']}ms, p95 {m['p95_ms']}ms, max {m['max_ms']}ms, "
+                            f"{m['bytes_per_s'] / 1024 / 1024:.2f} MB/s")
+
     def generate_reports(self, timestamp: str) -> Dict[str, str]:
         """
         Generate all reports (JSON, HTML, CSV)
@@ -130,6 +171,7 @@ class TestOrchestrator:
         """
         logger.info("CREATE REPORT SIMPLE")
 
+        self.processor.result_writer.add_api_metrics(request_metrics.summary())
         filepath_output, dir_session_name = self.processor.result_writer.save_all(timestamp)
 
         # HTML Simple Report
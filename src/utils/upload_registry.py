@@ -0,0 +1,141 @@
+"""Upload Registry - Remember which video contents were already uploaded to which AI server"""
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+
+class FingerprintCache:
+    """
+    Persistent JSON cache of SMB content fingerprints: {smb_path: {size, mtime, fingerprint}}
+    An entry is only reused while the file keeps the size and mtime it was fingerprinted with,
+    so unchanged videos are never read again to be fingerprinted.
+    """
+
+    def __init__(self, cache_file: str = cf.UPLOAD_FINGERPRINT_CACHE_FILE):
+        self.cache_file = Path(cache_file)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Fingerprint cache unreadable, starting empty: {e}")
+            return {}
+
+    def save(self):
+        """Write cache atomically (temp file + rename)"""
+        with self._lock:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+
+    def get(self, smb_path: str, size: int, mtime: float) -> Optional[str]:
+        with self._lock:
+            entry = self.data.get(smb_path)
+        if entry and entry.get('size') == size and entry.get('mtime') == mtime:
+            return entry.get('fingerprint')
+        return None
+
+    def put(self, smb_path: str, size: int, mtime: float, fingerprint: Optional[str]):
+        if not fingerprint:
+            return
+        with self._lock:
+            self.data[smb_path] = {'size': size, 'mtime': mtime, 'fingerprint': fingerprint}
+
+
+class UploadRegistry:
+    """
+    Persistent JSON registry: {server_url: {filename: {fingerprint, size, uploaded_at}}}
+    A video is skipped when the same filename with the same fingerprint is recorded for the server.
+    """
+
+    def __init__(self, registry_file: str = cf.UPLOAD_REGISTRY_FILE):
+        self.registry_file = Path(registry_file)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Dict]]:
+        if not self.registry_file.exists():
+            return {}
+        try:
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Upload registry unreadable, starting empty: {e}")
+            return {}
+
+    def save(self):
+        """Write registry atomically (temp file + rename)"""
+        with self._lock:
+            self.registry_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.registry_file.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.registry_file)
+
+    @staticmethod
+    def _server_key(server_url: str) -> str:
+        return server_url.rstrip('/')
+
+    def is_uploaded(self, server_url: str, filename: str, fingerprint: Optional[str]) -> bool:
+        """True if filename with this exact content is recorded as uploaded to server"""
+        if not fingerprint:
+            return False
+        with self._lock:
+            entry = self.data.get(self._server_key(server_url), {}).get(filename)
+        return bool(entry) and entry.get('fingerprint') == fingerprint
+
+    def mark_uploaded(self, server_url: str, filename: str, fingerprint: Optional[str]):
+        """Record filename/content as present on server"""
+        if not fingerprint:
+            return
+        with self._lock:
+            self.data.setdefault(self._server_key(server_url), {})[filename] = {
+                'fingerprint': fingerprint,
+                'size': int(fingerprint.split('-', 1)[0]),
+                'uploaded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+    def invalidate(self, server_url: Optional[str] = None) -> int:
+        """Forget uploads for one server (or all servers), returns number of removed entries"""
+        with self._lock:
+            if server_url is None:
+                removed = sum(len(v) for v in self.data.values())
+                self.data = {}
+            else:
+                removed = len(self.data.pop(self._server_key(server_url), {}))
+        logger.info(f"Upload registry: removed {removed} entries ({server_url or 'all servers'})")
+        return removed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Manage the local upload registry")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    invalidate_parser = subparsers.add_parser('invalidate', help="Forget uploads (use when the AI server is wiped)")
+    invalidate_parser.add_argument('--server', default=None, help="AI server URL, default: all servers")
+    subparsers.add_parser('show', help="Print number of recorded uploads per server")
+    args = parser.parse_args()
+
+    registry = UploadRegistry()
+    if args.command == 'invalidate':
+        registry.invalidate(args.server)
+        registry.save()
+    else:
+        for server, entries in registry.data.items():
+            print(f"{server}: {len(entries)} videos")
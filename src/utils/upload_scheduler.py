@@ -0,0 +1,163 @@
+"""Upload Scheduler - Split missing videos into size-bounded batches and upload them in parallel"""
+import logging
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Tuple
+
+from config.settings import cf
+from src.connectors.http_transport import CircuitOpenError
+from src.connectors.multipart import MultipartFileStream, VideoSource
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UploadBatch:
+    """One upload request worth of videos"""
+    index: int
+    videos: List[Tuple[str, VideoSource]] = field(default_factory=list)
+    total_bytes: int = 0
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _ in self.videos]
+
+
+class UploadScheduler:
+    """Upload videos in batches capped by total bytes over a bounded number of connections"""
+
+    def __init__(self, api, max_batch_bytes: int = cf.UPLOAD_BATCH_MAX_BYTES,
+                 max_workers: int = cf.UPLOAD_WORKERS, retries: int = cf.UPLOAD_RETRIES):
+        """
+        Args:
+            api: AIAPIClient instance
+            max_batch_bytes: Max total bytes of one batch (a bigger single video gets its own batch)
+            max_workers: Number of batches uploaded in parallel
+            retries: Attempts per batch
+        """
+        self.api = api
+        self.max_batch_bytes = max_batch_bytes
+        self.max_workers = max_workers
+        self.retries = retries
+
+    def plan_batches(self, groups: List[Tuple[List[str], int]]) -> List[List[str]]:
+        """
+        Group videos in order, starting a new batch when the byte cap would be exceeded
+        (a bigger single group gets its own batch). Planned from sizes, before the videos exist locally.
+        Args:
+            groups: [(video_names, total_bytes)] in order, each group is kept in one batch
+        Returns:
+            [[video_name, ...], ...] one list per batch
+        """
+        batches, current, current_bytes = [], [], 0
+        for names, size in groups:
+            if current and current_bytes + size > self.max_batch_bytes:
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.extend(names)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def _upload_batch(self, batch: UploadBatch, total_batches: int) -> Dict:
+        """Upload one batch, retrying only this batch on failure"""
+        stats = {
+            "batch": batch.index,
+            "videos": len(batch.videos),
+            "video_names": batch.names,
+            "bytes": batch.total_bytes,
+            "attempts": 0,
+            "duration_seconds": 0.0,
+            "throughput_mb_s": 0.0,
+            "status": "failed",
+            "error": "",
+        }
+        for attempt in range(1, self.retries + 1):
+            stats["attempts"] = attempt
+            start = time.perf_counter()
+            try:
+                self.api.upload_videos(batch.videos)
+            except Exception as e:
+                stats["error"] = str(e)
+                if isinstance(e, CircuitOpenError):
+                    break
+                if attempt < self.retries:
+                    delay = 2 ** (attempt - 1)
+                    logger.warning(f"Upload batch {batch.index}/{total_batches} failed "
+                                   f"({attempt}/{self.retries}): {e}, retry in {delay}s")
+                    time.sleep(delay)
+                continue
+
+            duration = time.perf_counter() - start
+            stats.update({
+                "duration_seconds": round(duration, 2),
+                "throughput_mb_s": round(batch.total_bytes / 1024 / 1024 / duration, 2) if duration > 0 else 0.0,
+                "status": "success",
+                "error": "",
+            })
+            logger.info(f"Upload batch {batch.index}/{total_batches}: {len(batch.videos)} videos, "
+                        f"{batch.total_bytes / 1024 / 1024:.2f} MB in {duration:.2f}s "
+                        f"({stats['throughput_mb_s']} MB/s)")
+            return stats
+
+        logger.error(f"Upload batch {batch.index}/{total_batches} failed after {self.retries} attempts: "
+                     f"{stats['error']} ({batch.names})")
+        return stats
+
+    def upload_spooled(self, groups: List[Tuple[List[str], int]],
+                       spool: Callable[[List[str], str], List[Tuple[str, VideoSource]]],
+                       spool_root: str) -> List[Dict]:
+        """
+        Fetch and upload batch by batch, so downloads and uploads overlap and temp disk stays bounded
+        The next batch is spooled while up to max_workers batches upload; a batch's spooled files are
+        deleted as soon as its upload finished, so at most max_workers + 1 batches are on disk.
+        Args:
+            groups: [(video_names, total_bytes)] in order, see plan_batches
+            spool: (video_names, batch_dir) -> [(video_name, source)] of the videos fetched into batch_dir
+            spool_root: Directory for per-batch spool dirs
+        Returns:
+            Per-batch stats in batch order: [{batch, videos, video_names, bytes, attempts, duration_seconds,
+            throughput_mb_s, status, error}, ...]
+        """
+        planned = self.plan_batches(groups)
+        if not planned:
+            return []
+
+        logger.info(f"Uploading {sum(len(names) for names in planned)} videos in {len(planned)} batches "
+                    f"(max {self.max_batch_bytes / 1024 / 1024:.0f} MB, {self.max_workers} parallel, "
+                    f"spooled batch by batch)")
+        workers = max(1, min(self.max_workers, len(planned)))
+        in_flight = {}  # future -> spool dir of its batch
+        futures = []
+
+        def release_finished(block: bool):
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                shutil.rmtree(in_flight.pop(future), ignore_errors=True)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for index, names in enumerate(planned, 1):
+                    release_finished(block=False)
+                    while len(in_flight) >= workers:
+                        release_finished(block=True)
+                    batch_dir = tempfile.mkdtemp(dir=spool_root)
+                    videos = spool(names, batch_dir)
+                    if not videos:
+                        shutil.rmtree(batch_dir, ignore_errors=True)
+                        continue
+                    batch = UploadBatch(index=index, videos=videos,
+                                        total_bytes=sum(MultipartFileStream.source_size(s) or 0 for _, s in videos))
+                    future = executor.submit(self._upload_batch, batch, len(planned))
+                    in_flight[future] = batch_dir
+                    futures.append(future)
+            finally:
+                while in_flight:
+                    release_finished(block=True)
+        return [future.result() for future in futures]
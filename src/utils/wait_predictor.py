@@ -0,0 +1,157 @@
+"""Wait Predictor - Learn AI processing time per video from past results files"""
+import json
+import logging
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+from config.settings import cf
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WaitPlan:
+    """Initial wait and polling schedule for a run"""
+    predicted_seconds: float
+    initial_wait: float
+    poll_interval: float
+    deadline: float
+    source: str
+    batch_seconds_per_video: Dict[str, float] = field(default_factory=dict)  # {batch_code: predicted seconds}
+
+
+class WaitTimePredictor:
+    """
+    Predict processing time from history in results JSON files.
+    Samples come from the AI completion measured while waiting (ai_completion), not from the rule's
+    phase 1-2 duration, which also holds the shared wait and other rules' work. The agent works through
+    videos one after another, so each sample is charged the time since the previous one completed:
+    - per rule_code: each batch is charged the time between the previous batch completion and its own
+      (completed_after_seconds), split by video count; its samples then add up to the measured wait
+    - per (rule_code, camera_code): each video is charged the time between the previous first evidence
+      of the run and its own (video_first_seen), split between videos first seen in the same poll.
+      Videos without evidence (Reject, missed) have no time of their own, theirs goes to the next video.
+    The median of samples is used so one stuck run does not skew the prediction.
+    """
+
+    def __init__(self, results_dir: str, max_files: int = cf.WAIT_HISTORY_MAX_FILES):
+        self.results_dir = Path(results_dir)
+        self.max_files = max_files
+        self.per_rule: Dict[str, List[float]] = {}
+        self.per_camera: Dict[Tuple[str, str], List[float]] = {}
+
+    @staticmethod
+    def batch_seconds_per_video(completion: Dict[str, Dict]) -> Dict[str, float]:
+        """{batch_code: per-video seconds} for batches detected done, from one run's ai_completion"""
+        groups: Dict[float, List[Tuple[str, int]]] = {}
+        for batch_code, info in completion.items():
+            completed_after = info.get('completed_after_seconds')
+            videos = info.get('expected_videos', 0)
+            if info.get('done') and completed_after is not None and videos:
+                groups.setdefault(completed_after, []).append((batch_code, videos))
+
+        per_video = {}
+        previous = 0.0
+        for completed_after in sorted(groups):
+            batches = groups[completed_after]
+            seconds = (completed_after - previous) / sum(videos for _, videos in batches)
+            for batch_code, _ in batches:
+                per_video[batch_code] = seconds
+            previous = completed_after
+        return per_video
+
+    @staticmethod
+    def video_seconds(completion: Dict[str, Dict]) -> Dict[str, Dict[str, float]]:
+        """{batch_code: {video_code: seconds}} from one run's ai_completion video_first_seen"""
+        groups: Dict[float, List[Tuple[str, str]]] = {}
+        for batch_code, info in completion.items():
+            for video_code, first_seen in info.get('video_first_seen', {}).items():
+                groups.setdefault(first_seen, []).append((batch_code, video_code))
+
+        seconds: Dict[str, Dict[str, float]] = {}
+        previous = 0.0
+        for first_seen in sorted(groups):
+            videos = groups[first_seen]
+            for batch_code, video_code in videos:
+                seconds.setdefault(batch_code, {})[video_code] = (first_seen - previous) / len(videos)
+            previous = first_seen
+        return seconds
+
+    def load_history(self) -> int:
+        """Read the most recent results files, returns number of batch samples"""
+        files = sorted(self.results_dir.glob('**/test_results_*.json'), key=lambda p: p.stat().st_mtime)
+        samples = 0
+        for path in files[-self.max_files:]:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    results = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.debug(f"Skip history file {path}: {e}")
+                continue
+
+            details = results.get('details', {})
+            completion = results.get('ai_completion', {})
+            for batch_code, per_video in self.batch_seconds_per_video(completion).items():
+                rule_code = details.get(batch_code, {}).get('rule_code', '')
+                if not rule_code:
+                    continue
+                self.per_rule.setdefault(rule_code, []).append(per_video)
+                samples += 1
+
+            for batch_code, videos in self.video_seconds(completion).items():
+                detail = details.get(batch_code, {})
+                rule_code = detail.get('rule_code', '')
+                camera_by_video = {video_code: camera_code
+                                   for camera_code, video_codes in detail.get('videos_config', {}).items()
+                                   for video_code in video_codes}
+                for video_code, seconds in videos.items():
+                    camera_code = camera_by_video.get(video_code)
+                    if rule_code and camera_code:
+                        self.per_camera.setdefault((rule_code, camera_code), []).append(seconds)
+
+        logger.info(f"Wait predictor: {samples} batch samples from {min(len(files), self.max_files)} results files")
+        return samples
+
+    def seconds_per_video(self, rule_code: str, camera_code: str = None) -> Tuple[float, str]:
+        """Per-video time: camera history, then rule history, then TIME_SLEEP"""
+        if camera_code and (rule_code, camera_code) in self.per_camera:
+            return statistics.median(self.per_camera[(rule_code, camera_code)]), 'camera'
+        if rule_code in self.per_rule:
+            return statistics.median(self.per_rule[rule_code]), 'rule'
+        return float(cf.TIME_SLEEP), 'default'
+
+    def predict(self, processed_rules: List) -> WaitPlan:
+        """Build the wait plan for all triggered batches (the agent processes them one after another)"""
+        predicted = 0.0
+        sources = set()
+        batch_seconds_per_video = {}
+        for processed in processed_rules:
+            batch_predicted, batch_videos = 0.0, 0
+            for camera_code, videos in processed.videos_config.items():
+                per_video, source = self.seconds_per_video(processed.rule.rule_code, camera_code)
+                batch_predicted += per_video * len(videos)
+                batch_videos += len(videos)
+                sources.add(source)
+            predicted += batch_predicted
+            if batch_videos:
+                batch_seconds_per_video[processed.batch_code] = round(batch_predicted / batch_videos, 1)
+
+        total_video = sum(len(v) for p in processed_rules for v in p.videos_config.values())
+        fixed_wait = cf.TIME_SLEEP * total_video
+
+        has_history = sources != {'default'}
+
+        plan = WaitPlan(
+            predicted_seconds=round(predicted, 1),
+            # Start polling a bit before the predicted finish; without history poll right away
+            initial_wait=round(predicted * cf.WAIT_INITIAL_RATIO, 1) if has_history else 0.0,
+            poll_interval=round(min(max(predicted / max(total_video, 1), cf.POLL_INTERVAL_MIN / 2), cf.POLL_INTERVAL_MAX), 1),
+            # Slow rules may exceed the fixed wait, give them room but keep the old wait as a floor
+            deadline=round(max(fixed_wait, predicted * cf.WAIT_DEADLINE_RATIO), 1),
+            source='+'.join(sorted(sources)) or 'default',
+            batch_seconds_per_video=batch_seconds_per_video
+        )
+        logger.info(f"Wait plan: {plan}")
+        return plan